@@ -19,6 +19,9 @@ done
 # Apply Django migrations
 python manage.py migrate
 
+# Table of the shared response cache
+python manage.py createcachetable
+
 # Create superuser if environment variables are set and there are no users present at all.
 if [ -n "$DJANGO_ADMIN_USERNAME" ] && [ -n "$DJANGO_ADMIN_PASSWORD" ]; then
   echo "Creating superuser..."
@@ -1,8 +1,9 @@
 import os
 from django.contrib import admin
 from django.utils.html import mark_safe
-from .models import Adventure, Checklist, ChecklistItem, Collection, Transportation, Note, AdventureImage
+from .models import Adventure, Checklist, ChecklistItem, Collection, Transportation, Note, AdventureImage, UserStats, MediaBlob, MirroredImage
 from worldtravel.models import Country, Region, VisitedRegion
+from worldtravel.catalog import invalidate_catalog
 
 
 class AdventureAdmin(admin.ModelAdmin):
@@ -20,9 +21,32 @@ class AdventureAdmin(admin.ModelAdmin):
     image_display.short_description = 'Image Preview'
 
 
-class CountryAdmin(admin.ModelAdmin):
+class CatalogAdminMixin:
+    # the catalog is cached until it changes, edits here count as a change. Only the
+    # saved regions are derived again, files and caches follow after the commit.
+    rebuild_geojson = False
+
+    def changed_regions(self, obj):
+        return []
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_catalog(self.changed_regions(obj), geojson=self.rebuild_geojson)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_catalog([], geojson=self.rebuild_geojson)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_catalog([], geojson=self.rebuild_geojson)
+
+
+class CountryAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'country_code', 'continent', 'number_of_regions')
     list_filter = ('continent', 'country_code')
+    # the GeoJSON is grouped by continent
+    rebuild_geojson = True
 
     def number_of_regions(self, obj):
         return Region.objects.filter(country=obj).count()
@@ -30,10 +54,13 @@ class CountryAdmin(admin.ModelAdmin):
     number_of_regions.short_description = 'Number of Regions'
 
 
-class RegionAdmin(admin.ModelAdmin):
+class RegionAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'country', 'number_of_visits')
     # list_filter = ('country', 'number_of_visits')
 
+    def changed_regions(self, obj):
+        return [obj.pk]
+
     def number_of_visits(self, obj):
         return VisitedRegion.objects.filter(region=obj).count()
     
@@ -93,6 +120,9 @@ admin.site.register(Note)
 admin.site.register(Checklist)
 admin.site.register(ChecklistItem)
 admin.site.register(AdventureImage, AdventureImageAdmin)
+admin.site.register(UserStats)
+admin.site.register(MediaBlob)
+admin.site.register(MirroredImage)
 
 admin.site.site_header = 'AdventureLog Admin'
 admin.site.site_title = 'AdventureLog Admin Site'
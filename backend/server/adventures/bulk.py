@@ -0,0 +1,192 @@
+import uuid
+from django.db import transaction
+from django.utils import timezone
+
+from worldtravel.geocoder import fill_location
+from worldtravel.lookup import queue_region_check
+from .cache import adventure_scope, collection_scope, invalidate, user_adventures_scope
+from .models import Adventure, Collection
+from .serializers import AdventureSerializer
+from .stats import adventure_counts, defer_stats_refresh, refresh_user_stats
+
+MAX_BULK_ITEMS = 5000
+BATCH_SIZE = 500
+
+
+class BulkAdventureWriter:
+    """
+    Validates and applies a batch of adventure creates, partial updates and deletes
+    for one user.
+
+    Collections and existing adventures are loaded with one query each, every row is
+    validated with AdventureSerializer, and the writes go through bulk_create,
+    bulk_update and a single delete. Rows that fail validation are reported per item
+    and skipped, unless `atomic` is set, in which case nothing is written.
+    """
+
+    def __init__(self, request, creates, updates, deletes, atomic=False):
+        self.request = request
+        self.user = request.user
+        self.creates = creates
+        self.updates = updates
+        self.deletes = deletes
+        self.atomic = atomic
+        self.results = {'create': [], 'update': [], 'delete': []}
+        self.has_errors = False
+
+    def error(self, section, index, errors, id=None):
+        self.has_errors = True
+        result = {'index': index, 'status': 'error', 'errors': errors}
+        if id is not None:
+            result['id'] = id
+        self.results[section].append(result)
+
+    def load_collections(self):
+        ids = set()
+        for item in self.creates + self.updates:
+            if isinstance(item, dict) and item.get('collection'):
+                ids.add(str(item['collection']))
+        valid_ids = [i for i in ids if _is_uuid(i)]
+        return {str(c.id): c for c in Collection.objects.filter(pk__in=valid_ids)}
+
+    def resolve_collection(self, item, collections):
+        """
+        Returns (collection, error). Applies the same ownership rule as the serializers.
+        """
+        collection_id = item.pop('collection', None)
+        if not collection_id:
+            return None, None
+        collection = collections.get(str(collection_id))
+        if collection is None:
+            return None, {'collection': ['Collection not found.']}
+        if collection.user_id_id != self.user.id:
+            return None, {'collection': ['Adventures must be associated with collections owned by the same user.']}
+        return collection, None
+
+    def validate_creates(self, collections):
+        instances = []
+        for index, item in enumerate(self.creates):
+            if not isinstance(item, dict):
+                self.error('create', index, {'non_field_errors': ['Expected an object.']})
+                continue
+            item = dict(item)
+            collection, errors = self.resolve_collection(item, collections)
+            if errors:
+                self.error('create', index, errors)
+                continue
+            serializer = AdventureSerializer(data=item, context={'request': self.request})
+            if not serializer.is_valid():
+                self.error('create', index, serializer.errors)
+                continue
+            adventure = Adventure(user_id=self.user, collection=collection, **serializer.validated_data)
+            # bulk_create does not send pre_save
+            fill_location(adventure)
+            if collection:
+                adventure.is_public = collection.is_public
+            instances.append((index, adventure))
+        return instances
+
+    def validate_updates(self, collections):
+        ids = [str(item.get('id')) for item in self.updates if isinstance(item, dict) and _is_uuid(item.get('id'))]
+        existing = {str(a.id): a for a in Adventure.objects.select_related('collection').filter(user_id=self.user, pk__in=ids)}
+
+        instances = []
+        fields = set()
+        now = timezone.now()
+        for index, item in enumerate(self.updates):
+            if not isinstance(item, dict):
+                self.error('update', index, {'non_field_errors': ['Expected an object.']})
+                continue
+            item = dict(item)
+            adventure_id = str(item.pop('id', None))
+            adventure = existing.get(adventure_id)
+            if adventure is None:
+                self.error('update', index, {'id': ['Adventure not found.']}, id=adventure_id)
+                continue
+            has_collection = 'collection' in item
+            collection, errors = self.resolve_collection(item, collections)
+            if errors:
+                self.error('update', index, errors, id=adventure_id)
+                continue
+            serializer = AdventureSerializer(adventure, data=item, partial=True, context={'request': self.request})
+            if not serializer.is_valid():
+                self.error('update', index, serializer.errors, id=adventure_id)
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(adventure, attr, value)
+                fields.add(attr)
+            if has_collection:
+                adventure.collection = collection
+                fields.add('collection')
+            if adventure.collection_id:
+                adventure.is_public = adventure.collection.is_public
+                fields.add('is_public')
+            if fill_location(adventure):
+                fields.add('location')
+            # bulk_update skips auto_now
+            adventure.updated_at = now
+            fields.add('updated_at')
+            instances.append((index, adventure))
+        return instances, fields
+
+    def validate_deletes(self):
+        ids = []
+        for index, adventure_id in enumerate(self.deletes):
+            if not _is_uuid(adventure_id):
+                self.error('delete', index, {'id': ['Invalid adventure ID.']}, id=str(adventure_id))
+                continue
+            ids.append((index, str(adventure_id)))
+        owned = set(str(pk) for pk in Adventure.objects.filter(
+            user_id=self.user, pk__in=[i for _, i in ids]).values_list('pk', flat=True))
+        found = []
+        for index, adventure_id in ids:
+            if adventure_id in owned:
+                found.append((index, adventure_id))
+            else:
+                self.error('delete', index, {'id': ['Adventure not found.']}, id=adventure_id)
+        return found
+
+    def run(self):
+        collections = self.load_collections()
+        creates = self.validate_creates(collections)
+        updates, update_fields = self.validate_updates(collections)
+        deletes = self.validate_deletes()
+
+        if self.has_errors and self.atomic:
+            return False
+
+        with transaction.atomic(), defer_stats_refresh():
+            if creates:
+                Adventure.objects.bulk_create([a for _, a in creates], batch_size=BATCH_SIZE)
+            if updates:
+                Adventure.objects.bulk_update([a for _, a in updates], sorted(update_fields), batch_size=BATCH_SIZE)
+            if deletes:
+                Adventure.objects.filter(user_id=self.user, pk__in=[i for _, i in deletes]).delete()
+            # bulk_create and bulk_update do not send post_save
+            refresh_user_stats(self.user.id, adventure_counts)
+            self.invalidate_cache(creates, updates)
+            queue_region_check(self.user.id)
+
+        self.results['create'] += [{'index': i, 'status': 'created', 'id': str(a.id)} for i, a in creates]
+        self.results['update'] += [{'index': i, 'status': 'updated', 'id': str(a.id)} for i, a in updates]
+        self.results['delete'] += [{'index': i, 'status': 'deleted', 'id': pk} for i, pk in deletes]
+        for section in self.results.values():
+            section.sort(key=lambda result: result['index'])
+        return True
+
+    def invalidate_cache(self, creates, updates):
+        scopes = [user_adventures_scope(self.user.id)]
+        for _, adventure in creates:
+            scopes.append(collection_scope(adventure.collection_id))
+        for _, adventure in updates:
+            scopes += [adventure_scope(adventure.id), collection_scope(adventure.collection_id),
+                       collection_scope(getattr(adventure, '_loaded_collection_id', None))]
+        invalidate(*set(scopes))
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return True
@@ -0,0 +1,107 @@
+import hashlib
+import uuid
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+RESPONSE_CACHE = 'responses'
+SCOPE_PREFIX = 'rc:scope:'
+
+
+def _cache():
+    return caches[RESPONSE_CACHE]
+
+
+def scope_tokens(scopes):
+    """
+    The current token of each scope. Invalidating a scope deletes its token, so every
+    response cached under the old one is never read again and simply expires.
+    """
+    cache = _cache()
+    keys = [f'{SCOPE_PREFIX}{scope}' for scope in scopes]
+    tokens = cache.get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            # add() keeps whichever token another worker stored first
+            cache.add(key, uuid.uuid4().hex, None)
+        tokens.update(cache.get_many(missing))
+    return [tokens.get(key, '') for key in keys]
+
+
+def invalidate(*scopes):
+    """
+    Drops the cached responses of `scopes` once the current transaction commits, so a
+    concurrent read cannot cache the old rows under the new token.
+    """
+    keys = [f'{SCOPE_PREFIX}{scope}' for scope in scopes if scope]
+    if keys:
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def invalidate_adventures(adventure_ids):
+    """
+    For writes that bypass the model signals (queryset updates, bulk_update): the
+    adventures and the collections that render them.
+    """
+    from .models import Adventure
+
+    adventure_ids = list(adventure_ids)
+    if not adventure_ids:
+        return
+    collection_ids = Adventure.objects.filter(pk__in=adventure_ids).exclude(collection=None) \
+        .values_list('collection_id', flat=True).distinct()
+    invalidate(*[adventure_scope(pk) for pk in adventure_ids], *[collection_scope(pk) for pk in collection_ids])
+
+
+def cached_response(request, name, scopes, build):
+    """
+    Returns the cached data of a read endpoint for this user, query string and the
+    current tokens of `scopes`, or calls `build` and caches its data when it is a 200.
+    """
+    tokens = scope_tokens(scopes)
+    params = sorted(request.query_params.lists())
+    raw = f'{name}|{request.user.pk}|{params}|{"|".join(tokens)}'
+    key = f'rc:response:{name}:{hashlib.md5(raw.encode("utf-8")).hexdigest()}'
+
+    cache = _cache()
+    data = cache.get(key)
+    if data is not None:
+        return Response(data)
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data)
+    return response
+
+
+# scope names, in one place so readers and the invalidating signals agree
+
+def _canonical(pk):
+    # URL kwargs may spell a UUID differently than the model instance does
+    try:
+        return str(uuid.UUID(str(pk)))
+    except ValueError:
+        return str(pk)
+
+
+def adventure_scope(pk):
+    return f'adventure:{_canonical(pk)}' if pk else None
+
+
+def collection_scope(pk):
+    return f'collection:{_canonical(pk)}' if pk else None
+
+
+def user_adventures_scope(user_id):
+    return f'user-adventures:{user_id}'
+
+
+def user_stats_scope(user_id):
+    return f'user-stats:{user_id}'
+
+
+def user_visits_scope(user_id):
+    return f'user-visits:{user_id}'
+
+
+CATALOG_SCOPE = 'catalog'
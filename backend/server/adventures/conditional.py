@@ -0,0 +1,80 @@
+import hashlib
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .models import Adventure, Checklist, Note, Transportation
+
+COLLECTION_CHILDREN = (Adventure, Transportation, Note, Checklist)
+
+
+class Validators:
+    """
+    ETag / Last-Modified pair for a set of rows, derived from `max(updated_at)` and the
+    row count (so deletes change it too) plus the requesting user, whose id decides
+    which rows and fields are visible.
+    """
+
+    def __init__(self, user, parts):
+        self.exists = any(count for count, _ in parts)
+        modified = [last for _, last in parts if last is not None]
+        self.last_modified = max(modified) if modified else None
+        state = '|'.join(f'{count}:{last.isoformat() if last else ""}' for count, last in parts)
+        digest = hashlib.md5(f'{user.pk}|{state}'.encode('utf-8')).hexdigest()
+        self.etag = quote_etag(digest)
+
+    @property
+    def timestamp(self):
+        return int(self.last_modified.timestamp()) if self.last_modified else None
+
+
+def _aggregate(queryset):
+    values = queryset.order_by().aggregate(count=Count('pk'), last=Max('updated_at'))
+    return values['count'], values['last']
+
+
+def queryset_validators(user, queryset):
+    return Validators(user, [_aggregate(queryset)])
+
+
+def collection_validators(user, queryset):
+    """
+    Collections are rendered with their children, so the validators also cover the
+    adventures, transportations, notes and checklists of every matched collection.
+    Image and checklist item writes touch their parent, see `signals.py`.
+    """
+    collection_ids = queryset.order_by().values('pk')
+    parts = [_aggregate(queryset)]
+    for model in COLLECTION_CHILDREN:
+        parts.append(_aggregate(model.objects.filter(collection__in=collection_ids)))
+    return Validators(user, parts)
+
+
+def precondition_failed(request, validators):
+    """
+    Evaluates If-Match / If-None-Match / If-(Un)Modified-Since and returns the 304 or 412
+    response to send instead of running the view, or None to carry on.
+    """
+    if not validators.exists:
+        # let the view produce its usual 404
+        return None
+    return get_conditional_response(request, etag=validators.etag, last_modified=validators.timestamp)
+
+
+def conditional_response(request, validators, build):
+    response = precondition_failed(request, validators)
+    if response is not None:
+        return response
+    response = build()
+    if validators.exists and response.status_code == 200:
+        set_validator_headers(response, validators)
+    return response
+
+
+def set_validator_headers(response, validators):
+    response['ETag'] = validators.etag
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.timestamp)
+    # responses are per user: let the browser keep them but always revalidate
+    response['Cache-Control'] = 'private, no-cache'
+    return response
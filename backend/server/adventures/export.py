@@ -0,0 +1,156 @@
+import json
+import zipfile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework import serializers
+
+from worldtravel.models import VisitedRegion
+from worldtravel.serializers import VisitedRegionSerializer
+from .models import Adventure, AdventureImage, Checklist, Collection, Note, Transportation
+from .serializers import AdventureImageSerializer, AdventureSerializer, ChecklistSerializer, NoteSerializer, TransportationSerializer
+
+CHUNK_SIZE = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class CollectionExportSerializer(serializers.ModelSerializer):
+    # children are exported as their own records
+    class Meta:
+        model = Collection
+        fields = ['id', 'user_id', 'name', 'description', 'is_public', 'is_archived', 'start_date', 'end_date', 'created_at', 'updated_at']
+
+
+def _collections(user):
+    return Collection.objects.filter(user_id=user).order_by('created_at', 'id')
+
+
+def _adventures(user):
+    return Adventure.objects.filter(user_id=user).prefetch_related('images').order_by('created_at', 'id')
+
+
+def _transportations(user):
+    return Transportation.objects.filter(user_id=user).order_by('created_at', 'id')
+
+
+def _notes(user):
+    return Note.objects.filter(user_id=user).order_by('created_at', 'id')
+
+
+def _checklists(user):
+    return Checklist.objects.filter(user_id=user).prefetch_related('checklistitem_set').order_by('created_at', 'id')
+
+
+def _visited_regions(user):
+    return VisitedRegion.objects.filter(user_id=user).order_by('id')
+
+
+def _images(user):
+    return AdventureImage.objects.filter(user_id=user).order_by('id')
+
+
+# (entity, record type, queryset, serializer), in export order
+EXPORT_ENTITIES = [
+    ('collections', 'collection', _collections, CollectionExportSerializer),
+    ('adventures', 'adventure', _adventures, AdventureSerializer),
+    ('transportations', 'transportation', _transportations, TransportationSerializer),
+    ('notes', 'note', _notes, NoteSerializer),
+    ('checklists', 'checklist', _checklists, ChecklistSerializer),
+    ('visited_regions', 'visited_region', _visited_regions, VisitedRegionSerializer),
+    ('images', 'image', _images, AdventureImageSerializer),
+]
+EXPORT_ENTITY_NAMES = [entity for entity, _, _, _ in EXPORT_ENTITIES]
+
+
+def iter_records(user, entity=None, offset=0):
+    """
+    Yields NDJSON lines for every record of the user, one entity type after the other.
+
+    Rows are read with server-side cursors (`iterator(chunk_size=...)`), so memory stays
+    flat. Each line carries its entity and offset. An interrupted export can be resumed
+    by passing the last seen entity and offset + 1.
+    """
+    started = entity is None
+    for name, record_type, queryset, serializer_class in EXPORT_ENTITIES:
+        if not started:
+            if name != entity:
+                continue
+            started = True
+            start = offset
+        else:
+            start = 0
+        for position, instance in enumerate(queryset(user)[start:].iterator(chunk_size=CHUNK_SIZE), start=start):
+            record = {
+                'type': record_type,
+                'entity': name,
+                'offset': position,
+                'data': serializer_class(instance).data,
+            }
+            yield (json.dumps(record, cls=DjangoJSONEncoder) + '\n').encode('utf-8')
+
+
+class _StreamBuffer:
+    """
+    Write-only sink for ZipFile. It has no tell/seek, so zipfile writes data
+    descriptors instead of seeking back, and what was written can be drained and
+    streamed right away.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(user, entity=None, offset=0):
+    """
+    Streams a ZIP with `data.ndjson` followed by the user's image files under `media/`.
+    Rows sharing a content-addressed blob reference the same `media/<name>`, which is
+    written once.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('data.ndjson', 'w', force_zip64=True) as entry:
+            for line in iter_records(user, entity, offset):
+                entry.write(line)
+                data = buffer.drain()
+                if data:
+                    yield data
+
+        written = set()
+        for name in iter_media_names(user, entity, offset):
+            if name in written or not default_storage.exists(name):
+                continue
+            written.add(name)
+            info = zipfile.ZipInfo(f'media/{name}', date_time=timezone.now().timetuple()[:6])
+            # images are already compressed
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(name, 'rb') as source, archive.open(info, 'w', force_zip64=True) as entry:
+                while True:
+                    chunk = source.read(FILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield buffer.drain()
+    yield buffer.drain()
+
+
+def iter_media_names(user, entity=None, offset=0):
+    images = _images(user)
+    if entity == 'images':
+        images = images[offset:]
+    for name in images.values_list('image', flat=True).iterator(chunk_size=CHUNK_SIZE):
+        if name:
+            yield name
+    if entity is None and user.profile_pic:
+        yield user.profile_pic.name
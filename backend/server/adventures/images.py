@@ -0,0 +1,235 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_adventures
+from .storage import acquire, release
+
+logger = logging.getLogger(__name__)
+
+# name -> maximum width in pixels
+VARIANT_WIDTHS = {
+    'thumbnail': 320,
+    'card': 800,
+    'full': 1920,
+}
+VARIANT_QUALITY = 75
+
+# sizes kept of images mirrored from Wikipedia
+MIRROR_WIDTHS = {
+    'thumb': 320,
+    'full': 1920,
+}
+# failed mirrors are tried again after this many seconds
+MIRROR_RETRY_AFTER = 60 * 60
+
+# profile pictures and the legacy Adventure.image are kept as a single downscaled WEBP
+SINGLE_IMAGE_SIZE = (1920, 1080)
+
+_executor = None
+
+
+def variant_formats():
+    """
+    WEBP always, AVIF when the installed Pillow can encode it (Pillow >= 11.2 or the
+    pillow-avif-plugin package).
+    """
+    Image.init()
+    formats = ['webp']
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    return formats
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                                       thread_name_prefix='image-processing')
+    return _executor
+
+
+def schedule(func, *args):
+    """
+    Run `func` after the current transaction commits. In the default `thread` mode it
+    runs on a small in-process pool. In `worker` mode nothing is scheduled and the
+    `process-images` command picks the pending images up instead.
+    """
+    if settings.IMAGE_PROCESSING_MODE != 'thread':
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, func, *args))
+
+
+def _run_in_thread(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Image processing failed for %s%s', func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def _open(name):
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    return _normalize(image)
+
+
+def _normalize(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    return image
+
+
+def _encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format.upper(), quality=VARIANT_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(name):
+    """
+    Encode the responsive widths of the stored image `name` in every supported
+    format. Returns {variant: {format: {'name', 'width', 'height'}}}.
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return _resize_and_save(_open(name), f'images/variants/{stem}', VARIANT_WIDTHS, variant_formats())
+
+
+def _resize_and_save(image, prefix, widths, formats):
+    variants = {}
+    for variant, max_width in widths.items():
+        resized = image
+        if image.width > max_width:
+            height = round(image.height * max_width / image.width)
+            resized = image.resize((max_width, height), Image.LANCZOS)
+        variants[variant] = {}
+        for format in formats:
+            saved = default_storage.save(f'{prefix}-{variant}.{format}', _encode(resized, format))
+            variants[variant][format] = {'name': saved, 'width': resized.width, 'height': resized.height}
+    return variants
+
+
+def variant_names(variants):
+    return [info['name'] for variant, formats in variants.items() if variant != 'source'
+            for info in formats.values()]
+
+
+def process_adventure_image(image_id):
+    from .models import Adventure, AdventureImage
+
+    image = AdventureImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return
+    AdventureImage.objects.filter(pk=image_id).update(processing_status='processing')
+    try:
+        variants = build_variants(image.image.name)
+    except Exception:
+        AdventureImage.objects.filter(pk=image_id).update(processing_status='failed')
+        raise
+    variants['source'] = image.image.name
+    # queryset updates so the post_save handler does not schedule the image again,
+    # which also means the blob references are counted here
+    with transaction.atomic():
+        updated = AdventureImage.objects.filter(pk=image_id, image=image.image.name).update(
+            variants=variants, processing_status='done')
+        if updated:
+            acquire(variant_names(variants))
+            release(variant_names(image.variants or {}))
+    Adventure.objects.filter(pk=image.adventure_id).update(updated_at=timezone.now())
+    invalidate_adventures([image.adventure_id])
+
+
+def process_single_image(model, pk, field):
+    """
+    Downscale and re-encode one image field to WEBP in place, as ResizedImageField
+    used to do inside the upload request.
+    """
+    instance = model.objects.filter(pk=pk).first()
+    file = getattr(instance, field, None) if instance else None
+    if not file or file.name.endswith('.webp'):
+        return
+    image = _open(file.name)
+    image.thumbnail(SINGLE_IMAGE_SIZE, Image.LANCZOS)
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+    directory = os.path.dirname(file.name)
+    saved = default_storage.save(f'{directory}/{stem}.webp', _encode(image, 'webp'))
+    with transaction.atomic():
+        # otherwise the field changed while we were encoding and our copy is left unreferenced
+        if model.objects.filter(pk=pk, **{field: file.name}).update(**{field: saved}):
+            acquire([saved])
+            release([file.name])
+            if model._meta.label == 'adventures.Adventure':
+                invalidate_adventures([pk])
+
+
+def mirror_key(source_url):
+    return hashlib.sha256(source_url.encode('utf-8')).hexdigest()
+
+
+def mirror_remote_image(source_url):
+    """
+    Download a remote (Wikipedia) image once and store MIRROR_WIDTHS WEBP copies of it.
+    """
+    from .models import MirroredImage
+    from .wikipedia import wikipedia
+
+    key = mirror_key(source_url)
+    mirror, _ = MirroredImage.objects.get_or_create(pk=key, defaults={'source_url': source_url})
+    if mirror.status == 'done':
+        return mirror
+    MirroredImage.objects.filter(pk=key).update(status='processing', updated_at=timezone.now())
+    try:
+        data = wikipedia.download(source_url)
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        variants = _resize_and_save(_normalize(image), f'images/mirrors/{key}', MIRROR_WIDTHS, ['webp'])
+    except Exception:
+        MirroredImage.objects.filter(pk=key).update(status='failed', updated_at=timezone.now())
+        raise
+    with transaction.atomic():
+        MirroredImage.objects.filter(pk=key).update(variants=variants, status='done', updated_at=timezone.now())
+        acquire(variant_names(variants))
+    mirror.variants, mirror.status = variants, 'done'
+    return mirror
+
+
+def mirrored_image(image, size):
+    """
+    The API response for a Wikipedia page image: the local copy of `size` once it is
+    mirrored, otherwise the original and a scheduled mirror job.
+    """
+    from .models import MirroredImage
+
+    source_url = image['source']
+    key = mirror_key(source_url)
+    mirror, created = MirroredImage.objects.get_or_create(pk=key, defaults={'source_url': source_url})
+    retry = MirroredImage.objects.filter(
+        pk=key, status='failed', updated_at__lt=timezone.now() - timedelta(seconds=MIRROR_RETRY_AFTER),
+    ).update(status='pending', updated_at=timezone.now())
+    if created or retry:
+        schedule(mirror_remote_image, source_url)
+
+    if mirror.status != 'done':
+        return {**image, 'mirror_status': 'pending' if retry else mirror.status}
+    info = mirror.variants[size]['webp']
+    public_url = os.environ.get('PUBLIC_URL', 'http://127.0.0.1:8000').rstrip('/').replace("'", "")
+    return {
+        'source': f"{public_url}/media/{info['name']}",
+        'width': info['width'],
+        'height': info['height'],
+        'original': image,
+        'mirror_status': 'done',
+    }
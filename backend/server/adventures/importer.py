@@ -0,0 +1,167 @@
+import csv
+import io
+import json
+from django.db import transaction
+
+from worldtravel.geocoder import fill_location
+from worldtravel.lookup import queue_region_check
+from .cache import collection_scope, invalidate, user_adventures_scope
+from .models import Adventure, Collection
+from .serializers import AdventureSerializer
+from .stats import adventure_counts, defer_stats_refresh, refresh_user_stats
+
+IMPORT_FORMATS = ['csv', 'ndjson']
+
+# accepted aliases for the coordinate columns
+FIELD_ALIASES = {
+    'lat': 'latitude',
+    'lon': 'longitude',
+    'lng': 'longitude',
+}
+
+
+class AdventureImporter:
+    """
+    Streams adventures from a CSV or NDJSON file into the database.
+
+    Rows are read one at a time, validated with AdventureSerializer and written with
+    bulk_create in fixed-size batches, so memory stays bounded by the batch size no
+    matter how large the file is. Collections referenced by name are looked up per
+    batch and created when missing. Row-level errors are collected (up to
+    `max_errors`, the rest are only counted) and `progress` is called after every batch.
+    """
+
+    def __init__(self, user, batch_size=500, max_errors=1000, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.progress = progress
+        self.collections = {}
+        self.report = {
+            'rows': 0,
+            'created': 0,
+            'failed': 0,
+            'collections_created': 0,
+            'errors': [],
+        }
+
+    def run(self, stream, format):
+        """
+        `stream` is a binary file-like object, `format` one of IMPORT_FORMATS.
+        """
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        rows = self.read_csv(text) if format == 'csv' else self.read_ndjson(text)
+
+        batch = []
+        try:
+            with defer_stats_refresh():
+                for line, row in rows:
+                    self.report['rows'] += 1
+                    adventure = self.build(line, row)
+                    if adventure is not None:
+                        batch.append(adventure)
+                    if len(batch) >= self.batch_size:
+                        self.flush(batch)
+                        batch = []
+                self.flush(batch)
+                # bulk_create does not send post_save
+                refresh_user_stats(self.user.id, adventure_counts)
+                queue_region_check(self.user.id)
+        finally:
+            # hand the underlying file back to the caller instead of closing it
+            text.detach()
+        return self.report
+
+    def read_csv(self, text):
+        reader = csv.DictReader(text)
+        for row in reader:
+            # line numbers count the header row
+            yield reader.line_num, row
+
+    def read_ndjson(self, text):
+        for line, raw in enumerate(text, start=1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError as e:
+                self.report['rows'] += 1
+                self.error(line, {'non_field_errors': [f'Invalid JSON: {e}']})
+                continue
+            yield line, row
+
+    def error(self, line, errors):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append({'line': line, 'errors': errors})
+
+    def normalize(self, row):
+        data = {}
+        for key, value in row.items():
+            if key is None:
+                continue
+            key = key.strip().lower()
+            key = FIELD_ALIASES.get(key, key)
+            if isinstance(value, str):
+                value = value.strip()
+                if value == '':
+                    continue
+            data[key] = value
+        for key in ('latitude', 'longitude'):
+            # the model stores 6 decimal places, other tools often export more
+            try:
+                data[key] = round(float(data[key]), 6)
+            except (KeyError, TypeError, ValueError):
+                pass
+        activity_types = data.get('activity_types')
+        if isinstance(activity_types, str):
+            # CSV cells hold the tags separated by semicolons
+            data['activity_types'] = [t.strip() for t in activity_types.split(';') if t.strip()]
+        return data
+
+    def build(self, line, row):
+        if not isinstance(row, dict):
+            self.error(line, {'non_field_errors': ['Expected an object.']})
+            return None
+        data = self.normalize(row)
+        collection_name = data.pop('collection', None)
+        data.pop('id', None)
+        serializer = AdventureSerializer(data=data)
+        if not serializer.is_valid():
+            self.error(line, serializer.errors)
+            return None
+        adventure = Adventure(user_id=self.user, **serializer.validated_data)
+        # bulk_create does not send pre_save
+        fill_location(adventure)
+        adventure._collection_name = str(collection_name) if collection_name else None
+        return adventure
+
+    def resolve_collections(self, batch):
+        batch_names = {a._collection_name for a in batch if a._collection_name}
+        names = batch_names - set(self.collections)
+        if names:
+            for collection in Collection.objects.filter(user_id=self.user, name__in=names).order_by('created_at'):
+                self.collections.setdefault(collection.name, collection)
+            for name in names - set(self.collections):
+                self.collections[name] = Collection.objects.create(user_id=self.user, name=name)
+                self.report['collections_created'] += 1
+            # only keep the lookup table bounded for files with very many collections
+            if len(self.collections) > 10000:
+                self.collections = {name: self.collections[name] for name in batch_names}
+        for adventure in batch:
+            if adventure._collection_name:
+                adventure.collection = self.collections[adventure._collection_name]
+                adventure.is_public = adventure.collection.is_public
+
+    def flush(self, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            self.resolve_collections(batch)
+            Adventure.objects.bulk_create(batch)
+            # bulk_create does not send post_save
+            invalidate(user_adventures_scope(self.user.id), *{collection_scope(a.collection_id) for a in batch})
+        self.report['created'] += len(batch)
+        if self.progress:
+            self.progress(self.report)
@@ -0,0 +1,162 @@
+import os
+from django.core.cache import caches
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from adventures.cache import RESPONSE_CACHE
+from adventures.images import variant_names
+from adventures.models import Adventure, AdventureImage, MediaBlob, MirroredImage
+from adventures.storage import BLOB_PREFIX, RELEASE_GRACE, blob_name, hash_file
+
+
+class Command(BaseCommand):
+    help = 'Moves existing media into the content-addressed blob storage, merging duplicates, and recounts blob references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be merged and reclaimed'
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.moved = {}
+        self.hashes = {}
+        self.stats = {'files': 0, 'duplicates': 0, 'missing': 0, 'reclaimed': 0, 'collected': 0}
+
+        User = get_user_model()
+        for model, field in ((AdventureImage, 'image'), (Adventure, 'image'), (User, 'profile_pic')):
+            self.migrate_field(model, field)
+        self.migrate_variants()
+
+        if not self.dry_run:
+            self.recount()
+            self.collect()
+            # image URLs changed in rows the signals did not see
+            caches[RESPONSE_CACHE].clear()
+
+        stats = self.stats
+        verb = 'Would reclaim' if self.dry_run else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["files"]} files checked, {stats["duplicates"]} duplicates merged, '
+            f'{stats["collected"]} unused blobs removed, {stats["missing"]} missing files skipped. '
+            f'{verb} {filesizeformat(stats["reclaimed"])} ({stats["reclaimed"]} bytes)'))
+
+    def migrate_field(self, model, field):
+        names = (model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                 .exclude(**{f'{field}__startswith': f'{BLOB_PREFIX}/'})
+                 .order_by().values_list(field, flat=True).distinct())
+        for name in names.iterator():
+            new_name = self.migrate_file(name)
+            if new_name and not self.dry_run:
+                model.objects.filter(**{field: name}).update(**{field: new_name})
+                self.delete_legacy(name)
+
+    def migrate_variants(self):
+        images = AdventureImage.objects.exclude(variants={}).only('id', 'variants')
+        for image in images.iterator(chunk_size=500):
+            variants = image.variants
+            legacy = []
+            for variant, formats in variants.items():
+                if variant == 'source':
+                    continue
+                for info in formats.values():
+                    if info['name'].startswith(f'{BLOB_PREFIX}/'):
+                        continue
+                    new_name = self.migrate_file(info['name'])
+                    if new_name:
+                        legacy.append(info['name'])
+                        info['name'] = new_name
+            source = variants.get('source')
+            if source in self.moved:
+                variants['source'] = self.moved[source]
+            if legacy and not self.dry_run:
+                AdventureImage.objects.filter(pk=image.pk).update(variants=variants)
+                for name in legacy:
+                    self.delete_legacy(name)
+
+    def migrate_file(self, name):
+        """
+        Returns the blob name for the legacy file `name`, creating the blob from it
+        when its content is not stored yet, or None when the file is missing.
+        """
+        if name in self.moved:
+            return self.moved[name]
+        if not default_storage.exists(name):
+            self.stats['missing'] += 1
+            return None
+        self.stats['files'] += 1
+        with default_storage.open(name, 'rb') as f:
+            content = File(f, name)
+            digest = hash_file(content)
+            size = content.size
+
+        blob = self.hashes.get(digest) or MediaBlob.objects.filter(sha256=digest).values_list('name', flat=True).first()
+        if blob:
+            self.stats['duplicates'] += 1
+            self.stats['reclaimed'] += size
+        else:
+            blob = blob_name(digest, os.path.splitext(name)[1].lower())
+            if not self.dry_run:
+                blob = self.store(name, blob)
+                MediaBlob.objects.update_or_create(sha256=digest, defaults={'name': blob, 'size': size})
+        self.hashes[digest] = blob
+        self.moved[name] = blob
+        return blob
+
+    def store(self, name, blob):
+        """
+        Puts the content of the legacy file `name` at `blob` and returns the stored name.
+        """
+        if default_storage.exists(blob):
+            return blob
+        target = default_storage.path(blob)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            # a hard link is instant and leaves the legacy file in place until the rows are updated
+            os.link(default_storage.path(name), target)
+            return blob
+        except OSError:
+            with default_storage.open(name, 'rb') as f:
+                # ContentAddressedStorage.save validates the name and stores it under the same hash
+                return default_storage.save(blob, File(f, name))
+
+    def delete_legacy(self, name):
+        # legacy files never live under the blob prefix, so this only removes the old copy
+        if not name.startswith(f'{BLOB_PREFIX}/'):
+            default_storage.delete(name)
+
+    def recount(self):
+        counts = {}
+        User = get_user_model()
+        for model, field in ((AdventureImage, 'image'), (Adventure, 'image'), (User, 'profile_pic')):
+            names = model.objects.filter(**{f'{field}__startswith': f'{BLOB_PREFIX}/'}).values_list(field, flat=True)
+            for name in names.iterator():
+                counts[name] = counts.get(name, 0) + 1
+        for model in (AdventureImage, MirroredImage):
+            for variants in model.objects.exclude(variants={}).values_list('variants', flat=True).iterator():
+                for name in variant_names(variants):
+                    counts[name] = counts.get(name, 0) + 1
+
+        groups = {}
+        for name, count in counts.items():
+            groups.setdefault(count, []).append(name)
+        with transaction.atomic():
+            MediaBlob.objects.update(ref_count=0)
+            for count, names in groups.items():
+                for start in range(0, len(names), 1000):
+                    MediaBlob.objects.filter(name__in=names[start:start + 1000]).update(ref_count=count)
+
+    def collect(self):
+        unused = MediaBlob.objects.filter(ref_count=0, updated_at__lt=timezone.now() - RELEASE_GRACE)
+        for name, size in unused.values_list('name', 'size').iterator():
+            with transaction.atomic():
+                if MediaBlob.objects.filter(name=name, ref_count=0).delete()[0]:
+                    default_storage.delete(name)
+                    self.stats['collected'] += 1
+                    self.stats['reclaimed'] += size
@@ -0,0 +1,51 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from adventures.importer import AdventureImporter, IMPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Imports adventures from a CSV or NDJSON file in streaming batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument(
+            '-u', '--username', required=True,
+            help='User that will own the imported adventures'
+        )
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS,
+            help='File format, detected from the extension when omitted'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of adventures written per batch'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User with username "{options["username"]}" does not exist.')
+
+        path = options['path']
+        format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        if not os.path.exists(path):
+            raise CommandError(f'File {path} does not exist.')
+
+        def progress(report):
+            self.stdout.write(f'{report["rows"]} rows read, {report["created"]} created, {report["failed"]} failed')
+
+        importer = AdventureImporter(user, batch_size=options['batch_size'], progress=progress)
+        with open(path, 'rb') as f:
+            report = importer.run(f, format)
+
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f'Line {error["line"]}: {error["errors"]}'))
+        if report['failed'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(f'... and {report["failed"] - len(report["errors"])} more errors'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report["created"]} of {report["rows"]} adventures '
+            f'({report["collections_created"]} collections created)'))
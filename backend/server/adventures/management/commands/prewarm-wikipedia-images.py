@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from adventures.images import mirror_remote_image
+from adventures.models import Adventure
+from adventures.wikipedia import WikipediaUnavailable, wikipedia
+
+
+class Command(BaseCommand):
+    help = 'Looks up and mirrors the Wikipedia images of adventures, by default the featured ones from travel-seed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            default='featured',
+            help='Adventure type to prewarm (default: featured)'
+        )
+        parser.add_argument(
+            '--public',
+            action='store_true',
+            help='Prewarm every public adventure instead of one type'
+        )
+
+    def handle(self, *args, **options):
+        adventures = Adventure.objects.all()
+        if options['public']:
+            adventures = adventures.filter(is_public=True)
+        else:
+            adventures = adventures.filter(type=options['type'])
+        names = adventures.order_by('name').values_list('name', flat=True).distinct()
+
+        mirrored = missing = failed = 0
+        for name in names.iterator():
+            try:
+                image = wikipedia.image(name)
+                if image is None:
+                    missing += 1
+                    continue
+                mirror_remote_image(image['source'])
+                mirrored += 1
+            except (WikipediaUnavailable, OSError) as e:
+                self.stdout.write(self.style.ERROR(f'{name}: {e}'))
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Mirrored {mirrored} images ({missing} without an image, {failed} failed)'))
@@ -0,0 +1,70 @@
+import time
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from adventures.images import mirror_remote_image, process_adventure_image, process_single_image
+from adventures.models import Adventure, AdventureImage, MirroredImage
+
+
+class Command(BaseCommand):
+    help = 'Builds the responsive variants of uploaded images and downscales cover and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reprocess every image, not only the pending ones'
+        )
+        parser.add_argument(
+            '--watch',
+            action='store_true',
+            help='Keep running and poll for new uploads (use with IMAGE_PROCESSING_MODE=worker)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds between polls in --watch mode'
+        )
+
+    def handle(self, *args, **options):
+        reprocess = options['all']
+        while True:
+            count = self.process(reprocess)
+            if count:
+                self.stdout.write(self.style.SUCCESS(f'Processed {count} images'))
+            if not options['watch']:
+                break
+            reprocess = False
+            time.sleep(options['interval'])
+
+    def process(self, reprocess):
+        images = AdventureImage.objects.all()
+        if not reprocess:
+            images = images.filter(processing_status__in=['pending', 'processing'])
+        count = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                process_adventure_image(image_id)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Image {image_id} failed: {e}'))
+            count += 1
+
+        User = get_user_model()
+        for model, field in ((Adventure, 'image'), (User, 'profile_pic')):
+            pending = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).exclude(
+                **{f'{field}__endswith': '.webp'})
+            for pk in pending.values_list('pk', flat=True).iterator():
+                try:
+                    process_single_image(model, pk, field)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'{model.__name__} {pk} failed: {e}'))
+                count += 1
+
+        mirrors = MirroredImage.objects.filter(status__in=['pending', 'processing'])
+        for source_url in mirrors.values_list('source_url', flat=True).iterator():
+            try:
+                mirror_remote_image(source_url)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Mirroring {source_url} failed: {e}'))
+            count += 1
+        return count
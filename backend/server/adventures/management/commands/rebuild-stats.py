@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from adventures.models import UserStats
+from adventures.cache import invalidate, user_stats_scope
+from adventures.stats import rebuild_user_stats
+from worldtravel.catalog import catalog_totals, invalidate_catalog_totals
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-user dashboard stats and the cached catalog totals from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-u', '--username',
+            help='Only rebuild the stats of this user'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.all()
+        if options['username']:
+            users = users.filter(username=options['username'])
+            if not users.exists():
+                self.stdout.write(self.style.ERROR(
+                    f'User with username "{options["username"]}" does not exist.'))
+                return
+        else:
+            # drop rows left behind by anything that bypassed the signals
+            UserStats.objects.exclude(user__in=users).delete()
+
+        count = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            rebuild_user_stats(user_id)
+            invalidate(user_stats_scope(user_id))
+            count += 1
+
+        invalidate_catalog_totals()
+        catalog_totals()
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt stats for {count} users'))
@@ -1,5 +1,6 @@
 # myapp/management/commands/seed.py
 
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from adventures.models import Adventure
@@ -8,6 +9,13 @@ from adventures.models import Adventure
 class Command(BaseCommand):
     help = 'Imports the featured adventures'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prewarm-images',
+            action='store_true',
+            help='Mirror the Wikipedia images of the featured adventures afterwards'
+        )
+
     def handle(self, *args, **kwargs):
         User = get_user_model()
         username = input(
@@ -48,3 +56,6 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS(
             'Successfully inserted featured adventures!'))
+
+        if kwargs['prewarm_images']:
+            call_command('prewarm-wikipedia-images', type='featured')
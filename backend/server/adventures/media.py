@@ -0,0 +1,190 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .images import MIRROR_WIDTHS, VARIANT_WIDTHS
+from .models import Adventure, AdventureImage, MirroredImage
+from .storage import BLOB_PREFIX
+
+mimetypes.add_type('image/avif', '.avif')
+mimetypes.add_type('image/webp', '.webp')
+
+CHUNK_SIZE = 64 * 1024
+# names under the blob prefix are content hashes and never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+LEGACY_MAX_AGE = 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# catalog assets written by worldtravel-seed, shown to everyone
+PUBLIC_PREFIXES = ('flags/',)
+
+
+def media_access(name, user):
+    """
+    Returns 'public', 'private' (only the requesting user may see it) or None when the
+    file is not referenced by anything the user can see. A blob can be shared by several
+    adventures, it is public when any of them is.
+    """
+    # normalized first, so `flags/../` cannot reach other files
+    if name.startswith(PUBLIC_PREFIXES) and posixpath.normpath(name) == name:
+        return 'public'
+    User = get_user_model()
+    if User.objects.filter(profile_pic=name).exists():
+        return 'public'
+
+    images = Q(image=name)
+    format = os.path.splitext(name)[1].lstrip('.').lower()
+    if format in ('webp', 'avif'):
+        for variant in VARIANT_WIDTHS:
+            images |= Q(variants__contains={variant: {format: {'name': name}}})
+    if format == 'webp':
+        # copies of Wikipedia images are public like the originals
+        mirrors = Q()
+        for variant in MIRROR_WIDTHS:
+            mirrors |= Q(variants__contains={variant: {'webp': {'name': name}}})
+        if MirroredImage.objects.filter(mirrors).exists():
+            return 'public'
+    adventures = Adventure.objects.filter(
+        Q(image=name) | Q(pk__in=AdventureImage.objects.filter(images).values('adventure_id')))
+
+    if adventures.filter(is_public=True).exists():
+        return 'public'
+    if user.is_authenticated and adventures.filter(user_id=user.id).exists():
+        return 'private'
+    return None
+
+
+def _etag(name, stat):
+    if name.startswith(f'{BLOB_PREFIX}/'):
+        # the content hash
+        return f'"{os.path.splitext(os.path.basename(name))[0]}"'
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _parse_range(header, size):
+    """
+    Returns (start, end) for a single `bytes=` range, 'unsatisfiable', or None to send
+    the whole file (no header, or several ranges, which we do not combine).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _file_response(request, path, size, etag, content_type):
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range == etag:
+        byte_range = _parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        # FileResponse hands the file to the server's wsgi.file_wrapper (sendfile where available)
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def _request_user(request):
+    """
+    The user of the session, token or JWT cookie, as the API views see it. Invalid
+    credentials count as anonymous, public files are still served to them.
+    """
+    if request.user.is_authenticated:
+        return request.user
+    authenticators = [authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        return Request(request, authenticators=authenticators).user
+    except APIException:
+        return AnonymousUser()
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves an uploaded file after checking that the user may see it. A plain view, not
+    an API view: DRF content negotiation would answer an image request with 406 or a
+    JSON error body.
+
+    With MEDIA_DELIVERY = 'accel' the transfer is handed to nginx via X-Accel-Redirect,
+    with 'sendfile' to Apache/lighttpd via X-Sendfile. The default 'django' streams the
+    file itself with single byte range support. Content-hashed blobs are cached as
+    immutable.
+    """
+    access = media_access(path, _request_user(request))
+    if access is None:
+        raise Http404
+    try:
+        full_path = default_storage.path(path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+
+    etag = _etag(path, stat)
+    if path.startswith(f'{BLOB_PREFIX}/'):
+        cache_control = f'{access}, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'{access}, max-age={LEGACY_MAX_AGE}'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        delivery = settings.MEDIA_DELIVERY
+        if delivery == 'accel':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = quote(f'{settings.MEDIA_ACCEL_PREFIX}{path}')
+        elif delivery == 'sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = _file_response(request, full_path, stat.st_size, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    response['Accept-Ranges'] = 'bytes'
+    if access == 'private':
+        patch_vary_headers(response, ['Cookie', 'Authorization'])
+    return response
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.8 on 2026-10-18 10:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION adventures_adventure_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(array_to_string(NEW.activity_types, ' '), '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS adventures_adventure_search_vector_trigger ON adventures_adventure;
+CREATE TRIGGER adventures_adventure_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, location, activity_types, description
+    ON adventures_adventure
+    FOR EACH ROW EXECUTE FUNCTION adventures_adventure_search_vector_update();
+
+-- backfill existing rows through the trigger
+UPDATE adventures_adventure SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS adventures_adventure_search_vector_trigger ON adventures_adventure;
+DROP FUNCTION IF EXISTS adventures_adventure_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0004_transportation_end_date'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='adventure',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER, DROP_SEARCH_VECTOR_TRIGGER),
+        migrations.AddIndex(
+            model_name='adventure',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='adventure_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='adventure',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='adventure_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='adventure',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['location'], name='adventure_location_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='adventure',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='adventure_description_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
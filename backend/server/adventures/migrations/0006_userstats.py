@@ -0,0 +1,32 @@
+# Generated by Django 5.0.8 on 2026-10-18 10:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0005_adventure_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('visited_count', models.PositiveIntegerField(default=0)),
+                ('planned_count', models.PositiveIntegerField(default=0)),
+                ('trips_count', models.PositiveIntegerField(default=0)),
+                ('visited_region_count', models.PositiveIntegerField(default=0)),
+                ('country_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User stats',
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-18 11:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0006_userstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adventure',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['activity_types'], name='adventure_activity_types_idx'),
+        ),
+    ]
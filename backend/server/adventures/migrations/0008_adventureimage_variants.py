@@ -0,0 +1,33 @@
+# Generated by Django 5.0.8 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0007_adventure_activity_types_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adventure',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='adventureimage',
+            name='image',
+            field=models.ImageField(upload_to='images/'),
+        ),
+        migrations.AddField(
+            model_name='adventureimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='adventureimage',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0009_mediablob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='adventure',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='adventureimage',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to='images/'),
+        ),
+        migrations.AddIndex(
+            model_name='adventureimage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['variants'], name='adventureimage_variants_idx', opclasses=['jsonb_path_ops']),
+        ),
+    ]
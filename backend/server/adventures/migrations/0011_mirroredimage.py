@@ -0,0 +1,28 @@
+# Generated by Django 5.0.8 on 2026-10-18 15:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0010_media_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredImage',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('source_url', models.TextField()),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['variants'], name='mirroredimage_variants_idx', opclasses=['jsonb_path_ops'])],
+            },
+        ),
+    ]
@@ -3,8 +3,9 @@ from django.db import models
 
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.forms import ValidationError
-from django_resized import ResizedImageField
 
 ADVENTURE_TYPES = [
     ('visited', 'Visited'),
@@ -25,6 +26,14 @@ TRANSPORTATION_TYPES = [
 ]
 
 
+IMAGE_PROCESSING_STATUSES = [
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('done', 'Done'),
+    ('failed', 'Failed')
+]
+
+
 # Assuming you have a default user ID you want to use
 default_user_id = 1  # Replace with an actual user ID
 
@@ -44,7 +53,8 @@ class Adventure(models.Model):
     description = models.TextField(blank=True, null=True)
     rating = models.FloatField(blank=True, null=True)
     link = models.URLField(blank=True, null=True)
-    image = ResizedImageField(force_format="WEBP", quality=75, null=True, blank=True, upload_to='images/')
+    # stored as uploaded, downscaled to WEBP in the background (see images.py)
+    image = models.ImageField(null=True, blank=True, upload_to='images/', db_index=True)
     date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
     is_public = models.BooleanField(default=False)
@@ -53,6 +63,18 @@ class Adventure(models.Model):
     collection = models.ForeignKey('Collection', on_delete=models.CASCADE, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # weighted name > location > activity types > description, maintained by a
+    # database trigger (see migration 0005) so bulk writes keep it up to date too
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='adventure_search_vector_idx'),
+            GinIndex(fields=['name'], name='adventure_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['location'], name='adventure_location_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['description'], name='adventure_description_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['activity_types'], name='adventure_activity_types_idx'),
+        ]
 
     def clean(self):
         if self.date and self.end_date and self.date > self.end_date:
@@ -197,8 +219,76 @@ class AdventureImage(models.Model):
     id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
     user_id = models.ForeignKey(
         User, on_delete=models.CASCADE, default=default_user_id)
-    image = ResizedImageField(force_format="WEBP", quality=75, upload_to='images/')
+    # the original is stored as uploaded, responsive variants are built in the background
+    image = models.ImageField(upload_to='images/', db_index=True)
     adventure = models.ForeignKey(Adventure, related_name='images', on_delete=models.CASCADE)
+    variants = models.JSONField(default=dict, blank=True)
+    processing_status = models.CharField(max_length=20, choices=IMAGE_PROCESSING_STATUSES, default='pending')
+
+    class Meta:
+        indexes = [
+            # variant lookups by name in the media view
+            GinIndex(fields=['variants'], name='adventureimage_variants_idx', opclasses=['jsonb_path_ops']),
+        ]
+
+    def __str__(self):
+        return self.image.url
+
+
+class UserStats(models.Model):
+    """
+    Per-user dashboard counters, kept current by the signals in signals.py and
+    rebuilt from scratch with the `rebuild-stats` management command.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    visited_count = models.PositiveIntegerField(default=0)
+    planned_count = models.PositiveIntegerField(default=0)
+    trips_count = models.PositiveIntegerField(default=0)
+    visited_region_count = models.PositiveIntegerField(default=0)
+    country_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "User stats"
+        verbose_name_plural = "User stats"
+
+    def __str__(self):
+        return f'Stats for user {self.user_id}'
+
+
+class MediaBlob(models.Model):
+    """
+    One stored file of the content-addressed media storage (see storage.py), shared
+    by every image field and variant that references it. The file is deleted when
+    `ref_count` drops to zero.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class MirroredImage(models.Model):
+    """
+    Local WEBP copies of a remote page image returned by the Wikipedia lookups, keyed
+    by the SHA-256 of its URL. `variants` has the same layout as AdventureImage.variants.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    source_url = models.TextField()
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=IMAGE_PROCESSING_STATUSES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['variants'], name='mirroredimage_variants_idx', opclasses=['jsonb_path_ops']),
+        ]
 
     def __str__(self):
-        return self.image.url
\ No newline at end of file
+        return self.source_url
@@ -0,0 +1,162 @@
+import base64
+import datetime
+import json
+import uuid
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination built on the ordering already applied to the queryset.
+
+    The first `order_by` term of the queryset (e.g. `-updated_at`, `lower_name`, `date`
+    or `rating`) is used as the sort key and `id` as the tie-breaker. Pages are fetched
+    with a `WHERE (key, id) > (last_key, last_id)` style filter instead of an OFFSET,
+    and no COUNT(*) is issued, so deep pages cost the same as the first one.
+    """
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    default_ordering = '-updated_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)] or [self.default_ordering]
+        self.descending = ordering[0].startswith('-')
+        self.field = ordering[0].lstrip('-')
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor.get('r'))
+
+        # NULLs always sort last in the forward direction so that the cursor
+        # filters below can treat them as the greatest value.
+        if self.descending != self.reverse:
+            queryset = queryset.order_by(F(self.field).desc(nulls_last=not self.reverse),
+                                         F('id').desc())
+        else:
+            queryset = queryset.order_by(F(self.field).asc(nulls_last=not self.reverse),
+                                         F('id').asc())
+
+        if cursor is not None:
+            queryset = queryset.filter(self.cursor_filter(cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def cursor_filter(self, cursor):
+        value, pk = cursor['v'], cursor['id']
+        # Walking towards the smaller end of the ordering, either because the
+        # ordering is descending or because we are paging backwards.
+        towards_lower = self.descending != self.reverse
+        # NULL keys are at the end of the forward direction.
+        nulls_ahead = not self.reverse
+        key_op = 'lt' if towards_lower else 'gt'
+        id_op = 'lt' if towards_lower else 'gt'
+
+        if value is None:
+            tie = Q(**{f'{self.field}__isnull': True, f'id__{id_op}': pk})
+            if nulls_ahead:
+                return tie
+            return tie | Q(**{f'{self.field}__isnull': False})
+
+        condition = Q(**{f'{self.field}__{key_op}': value}) | Q(**{self.field: value, f'id__{id_op}': pk})
+        if nulls_ahead:
+            condition |= Q(**{f'{self.field}__isnull': True})
+        return condition
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(cursor, dict) or 'v' not in cursor or 'id' not in cursor:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse):
+        cursor = {'v': getattr(instance, self.field), 'id': instance.id}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, default=_cursor_value).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def _cursor_value(value):
+    # Keep full microsecond precision, unlike DjangoJSONEncoder, so ties on
+    # `updated_at` are resolved by the `id` tie-breaker and not by truncation.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+
+def use_keyset_pagination(request):
+    """
+    Cursor pagination is opt-in: `?pagination=cursor` or any request carrying a cursor.
+    """
+    return request.query_params.get('pagination') == 'cursor' or \
+        KeysetPagination.cursor_query_param in request.query_params
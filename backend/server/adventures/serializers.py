@@ -1,12 +1,106 @@
 import os
 from .models import Adventure, AdventureImage, ChecklistItem, Collection, Note, Transportation, Checklist
 from rest_framework import serializers
+from django.db.models import Count, IntegerField, Max, Min, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.permissions import SAFE_METHODS
 
-class AdventureImageSerializer(serializers.ModelSerializer):
+
+def _sparse_params(request):
+    """
+    Parse `?fields=` and `?omit=` into (selected, omitted). `selected` is None when
+    every field is wanted. Only read requests are filtered so writes are unaffected.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    selected = {f.strip() for f in fields.split(',') if f.strip()} if fields else None
+    omitted = {f.strip() for f in omit.split(',') if f.strip()} if omit else set()
+    return selected, omitted
+
+
+def _sparse_keep(selected, omitted, parent_path, name):
+    path = f'{parent_path}.{name}' if parent_path else name
+    if path in omitted:
+        return False
+    if selected is None:
+        return True
+    prefix = f'{parent_path}.' if parent_path else ''
+    relevant = [f[len(prefix):] for f in selected if f.startswith(prefix)]
+    if not relevant:
+        # the nested field itself was selected, so all of its fields are included
+        return True
+    return any(f == name or f.startswith(name + '.') for f in relevant)
+
+
+def sparse_includes(request, path):
+    """
+    Whether the dotted field `path` (e.g. `adventures.images`) will be rendered for this request.
+    """
+    selected, omitted = _sparse_params(request)
+    parts = path.split('.')
+    return all(_sparse_keep(selected, omitted, '.'.join(parts[:i]), name) for i, name in enumerate(parts))
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients pick fields with `?fields=id,name,adventures.images` or drop them with
+    `?omit=description,adventures.images`. Nested serializers using the mixin are
+    filtered by their dotted path, and `sparse_queryset` defers the model columns of
+    omitted fields so they are never read from the database.
+    """
+    # columns that object permissions rely on are always loaded
+    sparse_always_load = ('id', 'user_id', 'is_public')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected, omitted = _sparse_params(self.context.get('request'))
+        if selected is None and not omitted:
+            return fields
+        path = self._sparse_path()
+        return {name: field for name, field in fields.items() if _sparse_keep(selected, omitted, path, name)}
+
+    def _sparse_path(self):
+        parts = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                parts.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(parts))
+
+    def sparse_queryset(self, queryset):
+        return sparse_defer(queryset, type(self), self.context.get('request'))
+
+
+def sparse_defer(queryset, serializer_class, request, path='', keep=()):
+    """
+    Defers the model columns of the `serializer_class` fields left out at the dotted
+    `path`, e.g. `adventures` for the adventures prefetched by a collection. `keep`
+    names columns that are loaded anyway, like the foreign key a prefetch matches on.
+    """
+    selected, omitted = _sparse_params(request)
+    if selected is None and not omitted:
+        return queryset
+    model_fields = {f.name: f for f in queryset.model._meta.concrete_fields}
+    always_load = set(serializer_class.sparse_always_load) | set(keep)
+    deferred = []
+    # the unfiltered fields, SparseFieldsMixin.get_fields would drop the omitted ones
+    for name, field in serializers.ModelSerializer.get_fields(serializer_class()).items():
+        if _sparse_keep(selected, omitted, path, name):
+            continue
+        source = field.source or name
+        model_field = model_fields.get(source)
+        if model_field is not None and not model_field.primary_key and source not in always_load:
+            deferred.append(source)
+    return queryset.defer(*deferred) if deferred else queryset
+
+class AdventureImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AdventureImage
-        fields = ['id', 'image', 'adventure']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'adventure', 'variants', 'processing_status']
+        read_only_fields = ['id', 'variants', 'processing_status']
 
     # def to_representation(self, instance):
     #     representation = super().to_representation(instance)
@@ -23,28 +117,77 @@ class AdventureImageSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        if instance.image:
+        if instance.image and 'image' in representation:
             public_url = os.environ.get('PUBLIC_URL', 'http://127.0.0.1:8000').rstrip('/')
             #print(public_url)
             # remove any  ' from the url
             public_url = public_url.replace("'", "")
             representation['image'] = f"{public_url}/media/{instance.image.name}"
+        if 'variants' in representation:
+            representation.update(self.variant_urls(instance.variants or {}))
         return representation
 
+    def variant_urls(self, variants):
+        """
+        Turns the stored variant names into public URLs and adds a `srcset` per format
+        (`srcset` for WEBP, `srcset_avif` when AVIF variants exist). Empty until the
+        background processing is done, clients fall back to `image`.
+        """
+        public_url = os.environ.get('PUBLIC_URL', 'http://127.0.0.1:8000').rstrip('/').replace("'", "")
+        urls = {}
+        srcsets = {}
+        for variant, formats in variants.items():
+            if variant == 'source':
+                continue
+            urls[variant] = {}
+            for format, info in formats.items():
+                url = f"{public_url}/media/{info['name']}"
+                urls[variant][format] = {'url': url, 'width': info['width'], 'height': info['height']}
+                srcsets.setdefault(format, []).append((info['width'], url))
+        data = {'variants': urls}
+        for format, entries in srcsets.items():
+            key = 'srcset' if format == 'webp' else f'srcset_{format}'
+            # smaller originals produce several variants of the same width
+            widths = {}
+            for width, url in sorted(entries):
+                widths.setdefault(width, url)
+            data[key] = ', '.join(f'{url} {width}w' for width, url in widths.items())
+        return data
+
 
                                         
-class AdventureSerializer(serializers.ModelSerializer):
+class AdventureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = AdventureImageSerializer(many=True, read_only=True)
     class Meta:
         model = Adventure
         fields = ['id', 'user_id', 'name', 'description', 'rating', 'activity_types', 'location', 'date', 'is_public', 'collection', 'created_at', 'updated_at', 'images', 'link', 'type', 'longitude', 'latitude', 'end_date']
         read_only_fields = ['id', 'created_at', 'updated_at', 'user_id']
 
+    @staticmethod
+    def setup_eager_loading(queryset, request=None, path='images'):
+        if sparse_includes(request, path):
+            images = sparse_defer(AdventureImage.objects.all(), AdventureImageSerializer, request, path, keep=('adventure',))
+            queryset = queryset.prefetch_related(Prefetch('images', queryset=images))
+        return queryset
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         return representation
+
+class AdventureSearchSerializer(AdventureSerializer):
+    rank = serializers.FloatField(read_only=True)
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(AdventureSerializer.Meta):
+        fields = AdventureSerializer.Meta.fields + ['rank', 'highlight']
+
+    def get_highlight(self, obj):
+        return {
+            'name': getattr(obj, 'name_highlight', None),
+            'description': getattr(obj, 'description_highlight', None),
+        }
     
-class TransportationSerializer(serializers.ModelSerializer):
+class TransportationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Transportation
@@ -78,7 +221,7 @@ class TransportationSerializer(serializers.ModelSerializer):
         validated_data['user_id'] = self.context['request'].user
         return super().create(validated_data)
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Note
@@ -111,7 +254,7 @@ class NoteSerializer(serializers.ModelSerializer):
         validated_data['user_id'] = self.context['request'].user
         return super().create(validated_data)
     
-class ChecklistItemSerializer(serializers.ModelSerializer):
+class ChecklistItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
         class Meta:
             model = ChecklistItem
             fields = [
@@ -143,7 +286,7 @@ class ChecklistItemSerializer(serializers.ModelSerializer):
             return super().create(validated_data)
     
     
-class ChecklistSerializer(serializers.ModelSerializer):
+class ChecklistSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = ChecklistItemSerializer(many=True, source='checklistitem_set')
     class Meta:
         model = Checklist
@@ -216,7 +359,7 @@ class ChecklistSerializer(serializers.ModelSerializer):
    
 
 
-class CollectionSerializer(serializers.ModelSerializer):
+class CollectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     adventures = AdventureSerializer(many=True, read_only=True, source='adventure_set')
     transportations = TransportationSerializer(many=True, read_only=True, source='transportation_set')
     notes = NoteSerializer(many=True, read_only=True, source='note_set')
@@ -227,3 +370,83 @@ class CollectionSerializer(serializers.ModelSerializer):
         # fields are all plus the adventures field
         fields = ['id', 'description', 'user_id', 'name', 'is_public', 'adventures', 'created_at', 'start_date', 'end_date', 'transportations', 'notes', 'updated_at', 'checklists', 'is_archived']
         read_only_fields = ['id', 'created_at', 'updated_at', 'user_id']
+
+    @staticmethod
+    def setup_eager_loading(queryset, request=None):
+        """
+        Load collections together with every nested child the serializer renders.
+
+        Costs one query for the collections plus one per relation (adventures, their
+        images, transportations, notes, checklists and checklist items), no matter how
+        many collections or children there are. Relations left out with `?fields=` or
+        `?omit=` are not fetched, and omitted columns of the fetched children are deferred.
+        """
+        def children(model, serializer_class, path, keep='collection'):
+            # columns of omitted child fields are deferred like the collection's own
+            return sparse_defer(model.objects.all(), serializer_class, request, path, keep=(keep,))
+
+        prefetches = []
+        if sparse_includes(request, 'adventures'):
+            prefetches.append(Prefetch('adventure_set', queryset=AdventureSerializer.setup_eager_loading(
+                children(Adventure, AdventureSerializer, 'adventures'), request, path='adventures.images')))
+        if sparse_includes(request, 'transportations'):
+            prefetches.append(Prefetch('transportation_set',
+                                       queryset=children(Transportation, TransportationSerializer, 'transportations')))
+        if sparse_includes(request, 'notes'):
+            prefetches.append(Prefetch('note_set', queryset=children(Note, NoteSerializer, 'notes')))
+        if sparse_includes(request, 'checklists'):
+            items = children(ChecklistItem, ChecklistItemSerializer, 'checklists.items', keep='checklist')
+            prefetches.append(Prefetch('checklist_set', queryset=children(Checklist, ChecklistSerializer, 'checklists')
+                                       .prefetch_related(Prefetch('checklistitem_set', queryset=items))))
+        return queryset.prefetch_related(*prefetches)
+
+
+def _child_count(model):
+    return Coalesce(Subquery(
+        model.objects.filter(collection=OuterRef('pk')).order_by().values('collection')
+        .annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+
+class CollectionSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Card-sized collection representation used by `?view=summary` on the collection
+    listings. Counts, cover image and date span are computed in SQL, no children
+    are loaded.
+    """
+    adventure_count = serializers.IntegerField(read_only=True)
+    transportation_count = serializers.IntegerField(read_only=True)
+    note_count = serializers.IntegerField(read_only=True)
+    checklist_count = serializers.IntegerField(read_only=True)
+    first_date = serializers.DateField(read_only=True)
+    last_date = serializers.DateField(read_only=True)
+    cover_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Collection
+        fields = ['id', 'user_id', 'name', 'is_public', 'is_archived', 'start_date', 'end_date', 'created_at', 'updated_at',
+                  'adventure_count', 'transportation_count', 'note_count', 'checklist_count', 'first_date', 'last_date', 'cover_image']
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset, request=None):
+        adventures = Adventure.objects.filter(collection=OuterRef('pk')).order_by().values('collection')
+        return queryset.annotate(
+            adventure_count=_child_count(Adventure),
+            transportation_count=_child_count(Transportation),
+            note_count=_child_count(Note),
+            checklist_count=_child_count(Checklist),
+            first_date=Subquery(adventures.annotate(first=Min('date')).values('first')),
+            last_date=Subquery(adventures.annotate(last=Max(Coalesce('end_date', 'date'))).values('last')),
+            cover_image_name=Subquery(
+                AdventureImage.objects.filter(adventure__collection=OuterRef('pk'))
+                .order_by('adventure__date', 'adventure__created_at').values('image')[:1]
+            ),
+        )
+
+    def get_cover_image(self, obj):
+        if not getattr(obj, 'cover_image_name', None):
+            return None
+        public_url = os.environ.get('PUBLIC_URL', 'http://127.0.0.1:8000').rstrip('/').replace("'", "")
+        return f"{public_url}/media/{obj.cover_image_name}"
@@ -0,0 +1,234 @@
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from worldtravel.models import Country, Region, VisitedRegion
+from worldtravel.geocoder import fill_location
+from worldtravel.lookup import queue_region_check
+from worldtravel.tiles import clear_tiles, invalidate_region_tiles, tile_invalidation_deferred
+from .cache import (adventure_scope, collection_scope, invalidate, invalidate_adventures,
+                    user_adventures_scope, user_visits_scope)
+from .images import process_adventure_image, process_single_image, schedule, variant_names
+from .models import Adventure, AdventureImage, Checklist, ChecklistItem, Collection, Note, Transportation
+from .storage import acquire, release
+from .stats import adventure_counts, region_counts, refresh_user_stats, trip_counts
+
+
+# Images and checklist items have no `updated_at` of their own that is rendered, so
+# writes to them touch the parent. That keeps the ETag / Last-Modified validators
+# in conditional.py, which only look at `updated_at`, correct.
+
+@receiver([post_save, post_delete], sender=AdventureImage)
+def touch_adventure(sender, instance, **kwargs):
+    Adventure.objects.filter(pk=instance.adventure_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=ChecklistItem)
+def touch_checklist(sender, instance, **kwargs):
+    Checklist.objects.filter(pk=instance.checklist_id).update(updated_at=timezone.now())
+
+
+# Dashboard counters in UserStats are refreshed for the affected user on every write,
+# so StatsViewSet.counts is a single primary-key read.
+
+@receiver([post_save, post_delete], sender=Adventure)
+def refresh_adventure_stats(sender, instance, **kwargs):
+    refresh_user_stats(instance.user_id_id, adventure_counts)
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def refresh_trip_stats(sender, instance, **kwargs):
+    refresh_user_stats(instance.user_id_id, trip_counts)
+
+
+@receiver([post_save, post_delete], sender=VisitedRegion)
+def refresh_region_stats(sender, instance, **kwargs):
+    refresh_user_stats(instance.user_id_id, region_counts)
+
+
+# Uploads are stored as they come in. Variants and WEBP downscaling run after the
+# transaction commits, see images.py.
+
+@receiver(post_save, sender=AdventureImage)
+def queue_adventure_image(sender, instance, **kwargs):
+    if not instance.image or instance.variants.get('source') == instance.image.name:
+        return
+    if instance.processing_status != 'pending':
+        AdventureImage.objects.filter(pk=instance.pk).update(processing_status='pending')
+        instance.processing_status = 'pending'
+    schedule(process_adventure_image, instance.pk)
+
+
+@receiver(post_save, sender=Adventure)
+def queue_adventure_cover(sender, instance, **kwargs):
+    if instance.image and not instance.image.name.endswith('.webp'):
+        schedule(process_single_image, Adventure, instance.pk, 'image')
+
+
+@receiver(pre_save, sender=Adventure)
+def fill_adventure_location(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None:
+        fill_location(instance)
+
+
+@receiver(post_save, sender=Adventure)
+def queue_adventure_regions(sender, instance, **kwargs):
+    if instance.type == 'visited' and instance.latitude is not None and instance.longitude is not None:
+        queue_region_check(instance.user_id_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def queue_profile_pic(sender, instance, **kwargs):
+    if instance.profile_pic and not instance.profile_pic.name.endswith('.webp'):
+        schedule(process_single_image, sender, instance.pk, 'profile_pic')
+
+
+# Media blobs are shared between rows (see storage.py), so every image field and
+# variant pointing at one counts as a reference. The old names are read before the
+# write, the difference is applied after it.
+
+MEDIA_FIELDS = {
+    AdventureImage: ['image', 'variants'],
+    Adventure: ['image'],
+    get_user_model(): ['profile_pic'],
+}
+
+
+def _media_names(values):
+    names = []
+    for field, value in values.items():
+        if field == 'variants':
+            names += variant_names(value or {})
+        elif value:
+            names.append(str(value))
+    return names
+
+
+def _stored_media_names(sender, instance, fields):
+    if not fields:
+        return []
+    deferred = instance.get_deferred_fields()
+    if any(field in deferred for field in fields):
+        values = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    else:
+        values = {field: getattr(instance, field) for field in fields}
+    return _media_names(values)
+
+
+def stash_media_names(sender, instance, update_fields=None, **kwargs):
+    fields = MEDIA_FIELDS[sender]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    instance._media_fields = fields
+    if instance._state.adding or not fields:
+        instance._media_names = []
+        return
+    values = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._media_names = _media_names(values)
+
+
+def count_media_references(sender, instance, **kwargs):
+    fields = getattr(instance, '_media_fields', MEDIA_FIELDS[sender])
+    old = Counter(getattr(instance, '_media_names', []))
+    new = Counter(_media_names({field: getattr(instance, field) for field in fields}))
+    acquire(list((new - old).elements()))
+    release(list((old - new).elements()))
+    instance._media_names = list(new.elements())
+
+
+def stash_deleted_media_names(sender, instance, **kwargs):
+    instance._media_names = _stored_media_names(sender, instance, MEDIA_FIELDS[sender])
+
+
+def release_media_references(sender, instance, **kwargs):
+    release(getattr(instance, '_media_names', []))
+
+
+for model in MEDIA_FIELDS:
+    pre_save.connect(stash_media_names, sender=model, dispatch_uid=f'stash_media_names_{model.__name__}')
+    post_save.connect(count_media_references, sender=model, dispatch_uid=f'count_media_references_{model.__name__}')
+    pre_delete.connect(stash_deleted_media_names, sender=model, dispatch_uid=f'stash_deleted_media_{model.__name__}')
+    post_delete.connect(release_media_references, sender=model, dispatch_uid=f'release_media_{model.__name__}')
+
+
+# Cached read responses (see cache.py) are dropped for exactly the scopes a write
+# touches. Moving a row to another collection changes both, so the collection it was
+# loaded with is remembered.
+
+COLLECTION_CHILDREN = (Adventure, Transportation, Note, Checklist)
+
+
+def remember_collection(sender, instance, **kwargs):
+    # read from __dict__ so a deferred column is not loaded
+    instance._loaded_collection_id = instance.__dict__.get('collection_id')
+
+
+def invalidate_collection_child(sender, instance, **kwargs):
+    scopes = [collection_scope(instance.collection_id),
+              collection_scope(getattr(instance, '_loaded_collection_id', None))]
+    if sender is Adventure:
+        scopes += [adventure_scope(instance.pk), user_adventures_scope(instance.user_id_id)]
+    invalidate(*scopes)
+    instance._loaded_collection_id = instance.collection_id
+
+
+for model in COLLECTION_CHILDREN:
+    post_init.connect(remember_collection, sender=model, dispatch_uid=f'remember_collection_{model.__name__}')
+    post_save.connect(invalidate_collection_child, sender=model, dispatch_uid=f'invalidate_child_{model.__name__}')
+    post_delete.connect(invalidate_collection_child, sender=model, dispatch_uid=f'invalidate_deleted_child_{model.__name__}')
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def invalidate_collection(sender, instance, **kwargs):
+    invalidate(collection_scope(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=AdventureImage)
+def invalidate_image_adventure(sender, instance, **kwargs):
+    invalidate_adventures([instance.adventure_id])
+
+
+@receiver([post_save, post_delete], sender=ChecklistItem)
+def invalidate_item_collection(sender, instance, **kwargs):
+    collection_id = Checklist.objects.filter(pk=instance.checklist_id).values_list('collection_id', flat=True).first()
+    invalidate(collection_scope(collection_id))
+
+
+@receiver([post_save, post_delete], sender=VisitedRegion)
+def invalidate_visits(sender, instance, **kwargs):
+    invalidate(user_visits_scope(instance.user_id_id))
+
+
+# Cached vector tiles (see worldtravel/tiles.py) follow the visit and adventure scopes
+# above. Region edits drop the tiles under the old and the new outline, country edits
+# everything, since every region tile carries its country code. worldtravel-seed defers
+# all of it to a single clear, see defer_tile_invalidation.
+
+def _region_extent(pk):
+    region = Region.objects.filter(pk=pk).only('geometry').first()
+    return region.geometry.extent if region and region.geometry else None
+
+
+@receiver(pre_save, sender=Region)
+def remember_region_extent(sender, instance, **kwargs):
+    if tile_invalidation_deferred():
+        return
+    instance._old_extent = _region_extent(instance.pk) if instance.pk else None
+
+
+@receiver([post_save, post_delete], sender=Region)
+def invalidate_region_tile_cache(sender, instance, **kwargs):
+    if tile_invalidation_deferred():
+        return
+    extents = [getattr(instance, '_old_extent', None), instance.geometry.extent if instance.geometry else None]
+    transaction.on_commit(lambda: invalidate_region_tiles(extents))
+
+
+@receiver([post_save, post_delete], sender=Country)
+def invalidate_tile_cache(sender, instance, **kwargs):
+    if tile_invalidation_deferred():
+        return
+    transaction.on_commit(clear_tiles)
@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+from django.db.models import Count, Q
+
+from worldtravel.models import VisitedRegion
+from .cache import invalidate, user_stats_scope
+from .models import Adventure, Collection, UserStats
+
+
+def adventure_counts(user_id):
+    return Adventure.objects.filter(user_id=user_id).aggregate(
+        visited_count=Count('pk', filter=Q(type='visited')),
+        planned_count=Count('pk', filter=Q(type='planned')),
+    )
+
+
+def trip_counts(user_id):
+    return {'trips_count': Collection.objects.filter(user_id=user_id).count()}
+
+
+def region_counts(user_id):
+    return VisitedRegion.objects.filter(user_id=user_id).aggregate(
+        visited_region_count=Count('pk'),
+        country_count=Count('region__country', distinct=True),
+    )
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_stats_refresh():
+    """
+    Collapse the refreshes triggered inside the block (e.g. one post_delete per row of
+    a bulk delete) into a single refresh per user and counter group on exit.
+    """
+    if getattr(_deferred, 'pending', None) is not None:
+        yield
+        return
+    _deferred.pending = set()
+    try:
+        yield
+    finally:
+        pending, _deferred.pending = _deferred.pending, None
+    refreshed = {}
+    for user_id, counter in pending:
+        refreshed.setdefault(user_id, []).append(counter)
+    for user_id, counters in refreshed.items():
+        refresh_user_stats(user_id, *counters)
+
+
+def refresh_user_stats(user_id, *counters):
+    """
+    Recompute only the given counter groups (e.g. `adventure_counts`) for one user.
+
+    Existing rows are updated in place and never created here, so a cascade delete
+    of the user cannot resurrect its stats row. Missing rows are built on first read
+    by `get_user_stats`.
+    """
+    pending = getattr(_deferred, 'pending', None)
+    if pending is not None:
+        pending.update((user_id, counter) for counter in counters)
+        return
+    values = {}
+    for counter in counters:
+        values.update(counter(user_id))
+    UserStats.objects.filter(pk=user_id).update(**values)
+    invalidate(user_stats_scope(user_id))
+
+
+def rebuild_user_stats(user_id):
+    values = {}
+    for counter in (adventure_counts, trip_counts, region_counts):
+        values.update(counter(user_id))
+    stats, _ = UserStats.objects.update_or_create(user_id=user_id, defaults=values)
+    return stats
+
+
+def get_user_stats(user_id):
+    return UserStats.objects.filter(pk=user_id).first() or rebuild_user_stats(user_id)
@@ -0,0 +1,118 @@
+import hashlib
+import os
+from collections import Counter
+from datetime import timedelta
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs'
+
+# A blob that was just written has no references yet until the row pointing at it is
+# saved. Blobs touched within this window are never removed when their count drops to
+# zero, `dedupe-media` collects them later.
+RELEASE_GRACE = timedelta(hours=1)
+
+
+def blob_name(digest, ext):
+    # two levels of 256 directories keep every directory small
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+def hash_file(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores every upload once, under the SHA-256 of its
+    content, in `blobs/ab/cd/<sha256><ext>`.
+
+    Saving content that is already stored returns the existing name without writing
+    anything. Files saved before this storage was enabled keep their names and are
+    served as before. Which rows use a blob is tracked in `MediaBlob.ref_count`, see
+    `acquire` and `release`.
+    """
+
+    def save(self, name, content, max_length=None):
+        from .models import MediaBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hash_file(content)
+        blob = MediaBlob.objects.filter(sha256=digest).first()
+        if blob is not None and self.exists(blob.name):
+            MediaBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now())
+            return blob.name
+
+        ext = os.path.splitext(name)[1].lower()
+        target = blob_name(digest, ext)
+        if not self.exists(target):
+            content.seek(0)
+            target = self._save(target, content)
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.update_or_create(
+                    sha256=digest, defaults={'name': target, 'size': content.size})
+        except IntegrityError:
+            # stored concurrently by another request, keep theirs
+            existing = MediaBlob.objects.get(sha256=digest)
+            if existing.name != target:
+                self.delete(target)
+            return existing.name
+        return target
+
+
+def _counted(names):
+    # {count: [names]}, so a blob referenced twice by one row is counted twice
+    groups = {}
+    for name, count in Counter(name for name in names if name).items():
+        groups.setdefault(count, []).append(name)
+    return groups
+
+
+def acquire(names):
+    """
+    Counts one more reference to each blob in `names`. Names outside the blob
+    storage are ignored.
+    """
+    from .models import MediaBlob
+
+    for count, group in _counted(names).items():
+        MediaBlob.objects.filter(name__in=group).update(
+            ref_count=F('ref_count') + count, updated_at=timezone.now())
+
+
+def release(names):
+    """
+    Drops one reference to each blob in `names` and deletes the blobs nobody uses
+    anymore, once the transaction commits.
+    """
+    from .models import MediaBlob
+
+    groups = _counted(names)
+    if not groups:
+        return
+    for count, group in groups.items():
+        MediaBlob.objects.filter(name__in=group).update(ref_count=Greatest(F('ref_count') - count, 0))
+    with transaction.atomic():
+        unused = list(MediaBlob.objects.select_for_update().filter(
+            name__in=[name for group in groups.values() for name in group],
+            ref_count=0, updated_at__lt=timezone.now() - RELEASE_GRACE).values_list('name', flat=True))
+        if unused:
+            MediaBlob.objects.filter(name__in=unused).delete()
+            transaction.on_commit(lambda: delete_files(unused))
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
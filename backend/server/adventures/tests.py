@@ -1,3 +1,654 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
-# Create your tests here.
+from .bulk import MAX_BULK_ITEMS
+from .importer import AdventureImporter
+from .models import Adventure, AdventureImage, Checklist, ChecklistItem, Collection, MediaBlob, Note, Transportation
+from .pagination import KeysetPagination
+from .serializers import CollectionSerializer
+from .storage import BLOB_PREFIX, RELEASE_GRACE
+from .wikipedia import WikipediaClient, WikipediaUnavailable
+
+User = get_user_model()
+
+
+class CollectionGraphLoaderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='loader', password='password')
+
+    def create_collections(self, count, children):
+        for i in range(count):
+            collection = Collection.objects.create(user_id=self.user, name=f'Trip {i}')
+            for j in range(children):
+                adventure = Adventure.objects.create(
+                    user_id=self.user, type='visited', name=f'Adventure {i}-{j}', collection=collection)
+                AdventureImage.objects.create(user_id=self.user, adventure=adventure, image=f'images/{i}-{j}.webp')
+                Transportation.objects.create(user_id=self.user, type='car', name=f'Drive {i}-{j}', collection=collection)
+                Note.objects.create(user_id=self.user, name=f'Note {i}-{j}', collection=collection)
+                checklist = Checklist.objects.create(user_id=self.user, name=f'Checklist {i}-{j}', collection=collection)
+                ChecklistItem.objects.create(user_id=self.user, name=f'Item {i}-{j}', checklist=checklist)
+
+    def count_serialization_queries(self, request=None):
+        with CaptureQueriesContext(connection) as context:
+            queryset = CollectionSerializer.setup_eager_loading(Collection.objects.filter(user_id=self.user), request)
+            data = CollectionSerializer(queryset, many=True, context={'request': request}).data
+        self.captured_sql = [query['sql'] for query in context.captured_queries]
+        return len(context.captured_queries), data
+
+    def test_query_count_is_constant(self):
+        self.create_collections(count=1, children=1)
+        small_count, small_data = self.count_serialization_queries()
+
+        self.create_collections(count=10, children=5)
+        large_count, large_data = self.count_serialization_queries()
+
+        self.assertEqual(len(small_data), 1)
+        self.assertEqual(len(large_data), 11)
+        self.assertEqual(small_count, large_count)
+        # collections + adventures + images + transportations + notes + checklists + items
+        self.assertEqual(large_count, 7)
+
+    def test_nested_children_are_serialized(self):
+        self.create_collections(count=2, children=3)
+        _, data = self.count_serialization_queries()
+
+        for collection in data:
+            self.assertEqual(len(collection['adventures']), 3)
+            self.assertEqual(len(collection['adventures'][0]['images']), 1)
+            self.assertEqual(len(collection['transportations']), 3)
+            self.assertEqual(len(collection['notes']), 3)
+            self.assertEqual(len(collection['checklists']), 3)
+            self.assertEqual(len(collection['checklists'][0]['items']), 1)
+
+    def test_omitted_nested_columns_are_not_read(self):
+        self.create_collections(count=2, children=3)
+        request = Request(APIRequestFactory().get('/', {'omit': 'adventures.description,checklists.items.name'}))
+        count, data = self.count_serialization_queries(request)
+
+        self.assertEqual(count, 7)
+        self.assertNotIn('description', data[0]['adventures'][0])
+        self.assertNotIn('name', data[0]['checklists'][0]['items'][0])
+        self.assertIn('name', data[0]['adventures'][0])
+        sql = ' '.join(self.captured_sql)
+        self.assertNotIn('"adventures_adventure"."description"', sql)
+        self.assertNotIn('"adventures_checklistitem"."name"', sql)
+        self.assertIn('"adventures_collection"."description"', sql)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='pager', password='password')
+        ratings = [None, 3, 3, None, 5, 1, None, 3, 5, None, 2, None, 3]
+        for i, rating in enumerate(ratings):
+            day = None if i % 3 == 0 else date(2024, 1, 1 + i % 4)
+            Adventure.objects.create(user_id=user, type='visited', name=f'Adventure {i}', rating=rating, date=day)
+        # two groups of identical timestamps, so the id decides most of the order
+        now = timezone.now()
+        for i, pk in enumerate(Adventure.objects.values_list('pk', flat=True)):
+            Adventure.objects.filter(pk=pk).update(updated_at=now - timedelta(hours=i % 2))
+
+    def page(self, ordering, url):
+        request = Request(APIRequestFactory().get(url))
+        paginator = KeysetPagination()
+        rows = paginator.paginate_queryset(Adventure.objects.order_by(ordering), request)
+        response = paginator.get_paginated_response([row.pk for row in rows]).data
+        return response['results'], response['next'], response['previous']
+
+    def expected(self, ordering):
+        # NULLs last, ties broken by id in the direction of the ordering
+        field, descending = ordering.lstrip('-'), ordering.startswith('-')
+        rows = list(Adventure.objects.values_list(field, 'pk'))
+        present = sorted([row for row in rows if row[0] is not None], reverse=descending)
+        missing = sorted([row for row in rows if row[0] is None], reverse=descending)
+        return [pk for _, pk in present + missing]
+
+    def assert_walks_both_ways(self, ordering):
+        forward, pages = [], []
+        url = '/api/adventures/?pagination=cursor&page_size=4'
+        while url:
+            results, url, previous = self.page(ordering, url)
+            forward += results
+            pages.append(results)
+        self.assertEqual(forward, self.expected(ordering))
+
+        # back from the last page through the previous links
+        backward = []
+        url = previous
+        while url:
+            results, _, url = self.page(ordering, url)
+            backward = results + backward
+        self.assertEqual(backward + pages[-1], forward)
+
+    def test_nullable_date(self):
+        self.assert_walks_both_ways('date')
+        self.assert_walks_both_ways('-date')
+
+    def test_nullable_rating(self):
+        self.assert_walks_both_ways('rating')
+        self.assert_walks_both_ways('-rating')
+
+    def test_ties_on_updated_at(self):
+        self.assert_walks_both_ways('-updated_at')
+        self.assert_walks_both_ways('updated_at')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        for i in range(30):
+            Adventure.objects.create(user_id=self.user, type='visited', name=f'Alpine hike {i}',
+                                     description='A long walk over the pass.')
+
+    def test_ranked_search_is_paginated_with_highlights(self):
+        response = self.api.get('/api/adventures/search/', {'query': 'alp'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNotNone(data['next'])
+        self.assertIn('<mark>Alpine</mark>', data['results'][0]['highlight']['name'])
+
+        response = self.api.get('/api/adventures/search/', {'query': 'alp', 'page': 2})
+        self.assertEqual(len(response.json()['results']), 5)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached', password='password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_writes_invalidate_cached_responses(self):
+        self.assertEqual(self.api.get('/api/activity-types/types/').json(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            adventure = Adventure.objects.create(
+                user_id=self.user, type='visited', name='Hike', activity_types=['hiking'])
+        self.assertEqual(self.api.get('/api/activity-types/types/').json(), ['hiking'])
+
+        self.assertEqual(self.api.get(f'/api/adventures/{adventure.id}/').json()['name'], 'Hike')
+        with self.captureOnCommitCallbacks(execute=True):
+            adventure.name = 'Long hike'
+            adventure.save()
+        self.assertEqual(self.api.get(f'/api/adventures/{adventure.id}/').json()['name'], 'Long hike')
+
+    def test_collection_sees_moved_children(self):
+        first = Collection.objects.create(user_id=self.user, name='First')
+        second = Collection.objects.create(user_id=self.user, name='Second')
+        with self.captureOnCommitCallbacks(execute=True):
+            adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Hike', collection=first)
+        self.assertEqual(len(self.api.get(f'/api/collections/{first.id}/').json()['adventures']), 1)
+        self.assertEqual(len(self.api.get(f'/api/collections/{second.id}/').json()['adventures']), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            adventure = Adventure.objects.get(pk=adventure.pk)
+            adventure.collection = second
+            adventure.save()
+        self.assertEqual(len(self.api.get(f'/api/collections/{first.id}/').json()['adventures']), 0)
+        self.assertEqual(len(self.api.get(f'/api/collections/{second.id}/').json()['adventures']), 1)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='conditional', password='password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.collection = Collection.objects.create(user_id=self.user, name='Trip')
+        self.adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Hike', collection=self.collection)
+        self.checklist = Checklist.objects.create(user_id=self.user, name='Packing', collection=self.collection)
+        self.item = ChecklistItem.objects.create(user_id=self.user, name='Boots', checklist=self.checklist)
+
+    def etag(self, url):
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_adventure_is_not_modified(self):
+        url = f'/api/adventures/{self.adventure.id}/'
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=self.etag(url))
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_if_match_is_rejected(self):
+        url = f'/api/adventures/{self.adventure.id}/'
+        etag = self.etag(url)
+        Adventure.objects.filter(pk=self.adventure.pk).update(name='Changed elsewhere')
+
+        response = self.api.patch(url, {'name': 'Mine'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.adventure.refresh_from_db()
+        self.assertEqual(self.adventure.name, 'Changed elsewhere')
+
+        response = self.api.patch(url, {'name': 'Mine'}, format='json', HTTP_IF_MATCH=self.etag(url))
+        self.assertEqual(response.status_code, 200)
+
+    def test_image_edit_changes_the_adventure_etag(self):
+        url = f'/api/adventures/{self.adventure.id}/'
+        etag = self.etag(url)
+        AdventureImage.objects.create(user_id=self.user, adventure=self.adventure, image='images/new.webp')
+
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_checklist_item_edit_changes_the_collection_etag(self):
+        url = f'/api/collections/{self.collection.id}/'
+        etag = self.etag(url)
+        self.item.is_checked = True
+        self.item.save()
+
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class BulkAdventureTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulk', password='password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Existing')
+
+    def bulk(self, **body):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post('/api/adventures/bulk/', body, format='json')
+
+    def batch(self, **extra):
+        # the second create has no name
+        return self.bulk(create=[{'name': 'New', 'type': 'visited'}, {'type': 'visited'}],
+                         update=[{'id': str(self.adventure.id), 'name': 'Renamed'}], **extra)
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        response = self.batch(atomic=True)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([r['index'] for r in response.json()['results']['create']], [1])
+        self.assertEqual(list(Adventure.objects.values_list('name', flat=True)), ['Existing'])
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        response = self.batch()
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results['create']], ['created', 'error'])
+        self.assertIn('name', results['create'][1]['errors'])
+        self.assertEqual(results['update'][0]['status'], 'updated')
+        self.assertEqual(set(Adventure.objects.values_list('name', flat=True)), {'Renamed', 'New'})
+
+    def test_other_users_collection_is_rejected(self):
+        other = User.objects.create_user(username='other', password='password')
+        collection = Collection.objects.create(user_id=other, name='Not mine')
+        response = self.bulk(create=[{'name': 'New', 'type': 'visited', 'collection': str(collection.id)}],
+                             update=[{'id': str(self.adventure.id), 'collection': str(collection.id)}])
+
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results['create'] + results['update']], ['error', 'error'])
+        self.assertIn('collection', results['create'][0]['errors'])
+        self.assertFalse(Adventure.objects.filter(collection=collection).exists())
+
+    def test_batch_size_is_capped(self):
+        response = self.bulk(delete=[str(uuid.uuid4()) for _ in range(MAX_BULK_ITEMS + 1)])
+        self.assertEqual(response.status_code, 400)
+
+    def test_updates_bump_updated_at(self):
+        Adventure.objects.filter(pk=self.adventure.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        etag = self.api.get(f'/api/adventures/{self.adventure.id}/')['ETag']
+
+        self.bulk(update=[{'id': str(self.adventure.id), 'rating': 4}])
+
+        self.adventure.refresh_from_db()
+        self.assertGreater(self.adventure.updated_at, timezone.now() - timedelta(minutes=1))
+        response = self.api.get(f'/api/adventures/{self.adventure.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rating'], 4)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='password')
+
+    def run_import(self, content, format, **options):
+        return AdventureImporter(self.user, **options).run(io.BytesIO(content.encode('utf-8')), format)
+
+    def test_csv_columns_are_normalized(self):
+        report = self.run_import(
+            'name,type,lat,lng,activity_types,collection\n'
+            'Summit,visited,46.55791234567,7.98301234567,hiking; climbing,Alps\n'
+            'Lake,planned,46.6,7.9,,Alps\n', 'csv')
+
+        self.assertEqual((report['created'], report['failed'], report['collections_created']), (2, 0, 1))
+        summit = Adventure.objects.get(name='Summit')
+        self.assertEqual(summit.latitude, Decimal('46.557912'))
+        self.assertEqual(summit.longitude, Decimal('7.983012'))
+        self.assertEqual(summit.activity_types, ['hiking', 'climbing'])
+        self.assertEqual(set(Adventure.objects.values_list('collection__name', flat=True)), {'Alps'})
+
+    def test_ndjson_coordinate_aliases(self):
+        self.run_import('{"name": "A", "type": "visited", "lat": 1.5, "lon": 2.5}\n', 'ndjson')
+        adventure = Adventure.objects.get(name='A')
+        self.assertEqual((adventure.latitude, adventure.longitude), (Decimal('1.5'), Decimal('2.5')))
+
+    def test_errors_are_capped(self):
+        report = self.run_import('{"type": "visited"}\n' * 5 + 'not json\n', 'ndjson', max_errors=2)
+
+        self.assertEqual((report['rows'], report['failed'], report['created']), (6, 6, 0))
+        self.assertEqual([error['line'] for error in report['errors']], [1, 2])
+
+    def test_upload_size_is_limited(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        upload = SimpleUploadedFile('adventures.csv', b'name,type\nSummit,visited\n')
+
+        with override_settings(IMPORT_MAX_BYTES=10):
+            response = api.post('/api/adventures/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 413)
+
+        upload.seek(0)
+        response = api.post('/api/adventures/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='password')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_zip_export_contains_records_and_images(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            os.makedirs(os.path.join(root, 'images'))
+            with open(os.path.join(root, 'images', 'hike.webp'), 'wb') as f:
+                f.write(b'image bytes')
+            adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Hike')
+            AdventureImage.objects.create(user_id=self.user, adventure=adventure, image='images/hike.webp')
+
+            response = self.api.get('/api/export/', {'export_format': 'zip'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+        records = [json.loads(line) for line in archive.read('data.ndjson').splitlines()]
+        self.assertEqual([r['data']['name'] for r in records if r['type'] == 'adventure'], ['Hike'])
+        self.assertEqual(archive.read('media/images/hike.webp'), b'image bytes')
+
+    def test_shared_blobs_are_written_once(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root, IMAGE_PROCESSING_MODE='worker'):
+            adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Hike')
+            for name in ('first.jpg', 'second.jpg'):
+                AdventureImage.objects.create(user_id=self.user, adventure=adventure,
+                                              image=SimpleUploadedFile(name, b'same bytes'))
+
+            response = self.api.get('/api/export/', {'export_format': 'zip'})
+            archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+        media = [name for name in archive.namelist() if name.startswith('media/')]
+        self.assertEqual(len(media), 1)
+        images = [json.loads(line)['data']['image'] for line in archive.read('data.ndjson').splitlines()
+                  if json.loads(line)['type'] == 'image']
+        self.assertEqual(len(images), 2)
+        self.assertTrue(all(image.endswith(media[0][len('media/'):]) for image in images))
+
+    def test_renderer_format_does_not_select_the_export(self):
+        # the frontend proxy adds ?format=json to every GET
+        response = self.api.get('/api/export/', {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        media = override_settings(MEDIA_ROOT=root.name, MEDIA_DELIVERY='django')
+        media.enable()
+        self.addCleanup(media.disable)
+
+        os.makedirs(os.path.join(root.name, 'images'))
+        for name in ('private.jpg', 'public.jpg'):
+            with open(os.path.join(root.name, 'images', name), 'wb') as f:
+                f.write(b'0123456789')
+        private = Adventure.objects.create(user_id=self.owner, type='visited', name='Private')
+        public = Adventure.objects.create(user_id=self.owner, type='visited', name='Public', is_public=True)
+        AdventureImage.objects.create(user_id=self.owner, adventure=private, image='images/private.jpg')
+        AdventureImage.objects.create(user_id=self.owner, adventure=public, image='images/public.jpg')
+        AdventureImage.objects.create(user_id=self.owner, adventure=private, image='images/missing.jpg')
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_owner_sees_private_file(self):
+        self.client.force_login(self.owner)
+        response = self.client.get('/media/images/private.jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b'0123456789')
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_token_authenticates_like_the_api(self):
+        token = Token.objects.create(user=self.owner)
+        response = self.client.get('/media/images/private.jpg', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_public_file_is_served_to_anyone(self):
+        response = self.client.get('/media/images/public.jpg')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('public'))
+
+    def test_country_flags_are_public(self):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'flags'))
+        with open(os.path.join(settings.MEDIA_ROOT, 'flags', 'tl.png'), 'wb') as f:
+            f.write(b'flag')
+        response = self.client.get('/media/flags/tl.png')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), b'flag')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(self.client.get('/media/flags/../images/private.jpg').status_code, 404)
+
+    def test_other_users_file_is_not_found(self):
+        self.client.force_login(self.other)
+        # an image Accept header must not turn the 404 into a 406
+        response = self.client.get('/media/images/private.jpg', HTTP_ACCEPT='image/webp')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/media/images/unknown.jpg').status_code, 404)
+
+    def test_missing_file_is_not_found(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get('/media/images/missing.jpg').status_code, 404)
+
+    def test_byte_ranges(self):
+        response = self.client.get('/media/images/public.jpg', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.client.get('/media/images/public.jpg', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_unchanged_file_is_not_sent_again(self):
+        etag = self.client.get('/media/images/public.jpg')['ETag']
+        response = self.client.get('/media/images/public.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        media = override_settings(MEDIA_ROOT=root.name, IMAGE_PROCESSING_MODE='worker')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username='storage', password='password')
+        self.adventure = Adventure.objects.create(user_id=self.user, type='visited', name='Hike')
+
+    def upload(self, name, content):
+        return AdventureImage.objects.create(
+            user_id=self.user, adventure=self.adventure, image=SimpleUploadedFile(name, content))
+
+    def test_same_content_is_stored_once(self):
+        first = self.upload('first.jpg', b'same bytes')
+        second = self.upload('second.jpg', b'same bytes')
+        other = self.upload('other.jpg', b'other bytes')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith(f'{BLOB_PREFIX}/'))
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).ref_count, 2)
+        self.assertEqual(MediaBlob.objects.get(name=other.image.name).ref_count, 1)
+
+    def test_blob_is_kept_while_referenced(self):
+        first = self.upload('first.jpg', b'same bytes')
+        second = self.upload('second.jpg', b'same bytes')
+        name = first.image.name
+        # older than the grace window
+        MediaBlob.objects.update(updated_at=timezone.now() - RELEASE_GRACE - timedelta(minutes=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_new_blob_survives_the_grace_window(self):
+        image = self.upload('first.jpg', b'same bytes')
+        name = image.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 0)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_references_follow_the_field(self):
+        image = self.upload('first.jpg', b'first bytes')
+        old_name = image.image.name
+        image.image = self.upload('second.jpg', b'second bytes').image.name
+        image.save()
+
+        self.assertEqual(MediaBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(name=image.image.name).ref_count, 2)
+
+
+class StubWikipediaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+        time.sleep(server.delay)
+        if server.status != 200:
+            self.send_response(server.status)
+            self.end_headers()
+            return
+        title = parse_qs(urlparse(self.path).query)['titles'][0]
+        page = server.pages.get(title, {'ns': 0, 'title': title, 'missing': ''})
+        body = json.dumps({'query': {'pages': {'1': page}}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'wikipedia-tests'},
+    },
+    WIKIPEDIA_TIMEOUT=(1, 1),
+    WIKIPEDIA_BREAKER_THRESHOLD=2,
+    WIKIPEDIA_BREAKER_COOLDOWN=60,
+)
+class WikipediaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWikipediaHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = 0
+        self.server.delay = 0
+        self.server.status = 200
+        # clients that timed out leave broken pipes behind
+        self.server.handle_error = lambda request, client_address: None
+        self.server.pages = {
+            'Paris': {'pageid': 1, 'title': 'Paris', 'extract': 'Capital of France.',
+                      'original': {'source': 'https://upload.example/paris.jpg', 'width': 10, 'height': 10}},
+        }
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        settings_override = override_settings(WIKIPEDIA_API_URL=f'http://127.0.0.1:{self.server.server_port}/w/api.php')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches['responses'].clear()
+        self.wikipedia = WikipediaClient()
+
+    def test_results_and_misses_are_cached(self):
+        self.assertEqual(self.wikipedia.description('Paris')['extract'], 'Capital of France.')
+        self.assertEqual(self.wikipedia.description('paris')['extract'], 'Capital of France.')
+        self.assertIsNone(self.wikipedia.description('Nowhere'))
+        self.assertIsNone(self.wikipedia.description('Nowhere'))
+        self.assertEqual(self.server.hits, 2)
+        # only the first letter is case insensitive
+        self.assertIsNone(self.wikipedia.description('PARIS'))
+        self.assertEqual(self.server.hits, 3)
+
+    def test_concurrent_lookups_share_one_request(self):
+        self.server.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.wikipedia.image('Paris'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.hits, 1)
+        self.assertEqual([r['source'] for r in results], ['https://upload.example/paris.jpg'] * 5)
+
+    def test_timeout_without_cached_entry(self):
+        self.server.delay = 1.5
+        with self.assertRaises(WikipediaUnavailable):
+            self.wikipedia.description('Paris')
+
+    @override_settings(WIKIPEDIA_CACHE_TTL=0)
+    def test_breaker_serves_stale_entries(self):
+        self.assertEqual(self.wikipedia.description('Paris')['extract'], 'Capital of France.')
+        self.server.status = 500
+        for _ in range(3):
+            # expired, but served while upstream fails
+            self.assertEqual(self.wikipedia.description('Paris')['extract'], 'Capital of France.')
+        # the breaker opened after two failures, the third lookup did not reach upstream
+        self.assertEqual(self.server.hits, 3)
+        with self.assertRaises(WikipediaUnavailable):
+            self.wikipedia.description('Rome')
+        self.assertEqual(self.server.hits, 3)
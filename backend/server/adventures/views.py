@@ -1,16 +1,30 @@
+import re
 import uuid
-import requests
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 from rest_framework.decorators import action
 from rest_framework import viewsets
 from django.db.models.functions import Lower
 from rest_framework.response import Response
 from .models import Adventure, Checklist, Collection, Transportation, Note, AdventureImage
-from worldtravel.models import VisitedRegion, Region, Country
-from .serializers import AdventureImageSerializer, AdventureSerializer, CollectionSerializer, NoteSerializer, TransportationSerializer, ChecklistSerializer
+from .serializers import AdventureImageSerializer, AdventureSearchSerializer, AdventureSerializer, CollectionSerializer, CollectionSummarySerializer, NoteSerializer, TransportationSerializer, ChecklistSerializer
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Prefetch
+from django.db.models import F, Q
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, TrigramSimilarity
 from .permissions import IsOwnerOrReadOnly, IsPublicReadOnly
+from .pagination import KeysetPagination, use_keyset_pagination
+from .stats import get_user_stats
+from .cache import CATALOG_SCOPE, adventure_scope, cached_response, collection_scope, invalidate, user_adventures_scope, user_stats_scope
+from .bulk import BulkAdventureWriter, MAX_BULK_ITEMS
+from .importer import AdventureImporter, IMPORT_FORMATS
+from .export import EXPORT_ENTITY_NAMES, iter_records, iter_zip
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import MultiPartParser
+from worldtravel.catalog import catalog_totals
+from .wikipedia import WikipediaUnavailable, wikipedia
+from .images import MIRROR_WIDTHS, mirrored_image
+from django.conf import settings
+from .conditional import collection_validators, conditional_response, precondition_failed, queryset_validators, set_validator_headers
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from rest_framework import status
@@ -26,6 +40,27 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Q
 
+def paginate_keyset(view, queryset, request):
+    # Used by the `all` actions that are unpaginated unless cursor pagination is requested
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = view.get_serializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def add_highlights(adventures, search_query):
+    # ts_headline is expensive, so it runs for one page of results in a second query
+    highlights = Adventure.objects.filter(pk__in=[adventure.pk for adventure in adventures]).annotate(
+        name_highlight=SearchHeadline('name', search_query, config='english',
+                                      start_sel='<mark>', stop_sel='</mark>', highlight_all=True),
+        description_highlight=SearchHeadline('description', search_query, config='english',
+                                             start_sel='<mark>', stop_sel='</mark>', max_words=35, min_words=15),
+    ).values_list('pk', 'name_highlight', 'description_highlight')
+    by_pk = {pk: (name, description) for pk, name, description in highlights}
+    for adventure in adventures:
+        adventure.name_highlight, adventure.description_highlight = by_pk.get(adventure.pk, (None, None))
+
+
 class AdventureViewSet(viewsets.ModelViewSet):
     serializer_class = AdventureSerializer
     permission_classes = [IsOwnerOrReadOnly, IsPublicReadOnly]
@@ -77,31 +112,99 @@ class AdventureViewSet(viewsets.ModelViewSet):
             # For other actions, only include user's own adventures
             return Adventure.objects.filter(user_id=self.request.user.id)
 
+    def prepare_queryset(self, queryset):
+        # prefetch images and defer columns left out by ?fields= / ?omit=
+        queryset = AdventureSerializer.setup_eager_loading(queryset, self.request)
+        return self.get_serializer().sparse_queryset(queryset)
+
     def list(self, request, *args, **kwargs):
         # Prevent listing all adventures
         return Response({"detail": "Listing all adventures is not allowed."},
                         status=status.HTTP_403_FORBIDDEN)
 
     def retrieve(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        adventure = get_object_or_404(queryset, pk=kwargs['pk'])
+        validators = queryset_validators(request.user, self.get_queryset().filter(pk=kwargs['pk']))
+        return conditional_response(request, validators, lambda: cached_response(
+            request, 'adventure', [adventure_scope(kwargs['pk'])], lambda: self.build_retrieve(kwargs['pk'])))
+
+    def build_retrieve(self, pk):
+        queryset = self.prepare_queryset(self.get_queryset())
+        adventure = get_object_or_404(queryset, pk=pk)
         serializer = self.get_serializer(adventure)
         return Response(serializer.data)
+
+    def update(self, request, *args, **kwargs):
+        # If-Match gives clients optimistic concurrency on edits
+        queryset = self.get_queryset().filter(pk=kwargs['pk'])
+        response = precondition_failed(request, queryset_validators(request.user, queryset))
+        if response is not None:
+            return response
+        response = super().update(request, *args, **kwargs)
+        return set_validator_headers(response, queryset_validators(request.user, queryset))
     
     def perform_create(self, serializer):
-        adventure = serializer.save(user_id=self.request.user)
-        if adventure.collection:
-            adventure.is_public = adventure.collection.is_public
-            adventure.save()
+        # adventures in a collection follow its is_public flag, set before the single save
+        collection = serializer.validated_data.get('collection')
+        if collection:
+            serializer.save(user_id=self.request.user, is_public=collection.is_public)
+        else:
+            serializer.save(user_id=self.request.user)
 
     def perform_update(self, serializer):
-        adventure = serializer.save()
-        if adventure.collection:
-            adventure.is_public = adventure.collection.is_public
-            adventure.save()
-    
-    def perform_create(self, serializer):
-        serializer.save(user_id=self.request.user)
+        collection = serializer.validated_data.get('collection', serializer.instance.collection)
+        if collection:
+            serializer.save(is_public=collection.is_public)
+        else:
+            serializer.save()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create, partially update and delete many adventures in one request.
+
+        Body: `{"create": [...], "update": [{"id": ..., ...}], "delete": [id, ...], "atomic": false}`.
+        Every item gets a result with its index and status. With `atomic` any invalid
+        item aborts the whole batch and nothing is written.
+        """
+        if not request.user.is_authenticated:
+            return Response({"error": "User is not authenticated"}, status=400)
+        creates = request.data.get('create', [])
+        updates = request.data.get('update', [])
+        deletes = request.data.get('delete', [])
+        if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+            return Response({"error": "create, update and delete must be lists"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(creates) + len(updates) + len(deletes) > MAX_BULK_ITEMS:
+            return Response({"error": f"A batch can contain at most {MAX_BULK_ITEMS} items"}, status=status.HTTP_400_BAD_REQUEST)
+
+        writer = BulkAdventureWriter(request, creates, updates, deletes, atomic=request.data.get('atomic') is True)
+        if not writer.run():
+            return Response({"error": "The batch was not applied because some items are invalid", "results": writer.results},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": writer.results})
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """
+        Import adventures from an uploaded CSV or NDJSON `file`, streamed in batches.
+
+        The file is processed within the request, so it may be at most IMPORT_MAX_BYTES
+        (20 MB by default), larger files are answered with 413. The `import-adventures`
+        management command has no limit.
+        """
+        if not request.user.is_authenticated:
+            return Response({"error": "User is not authenticated"}, status=400)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.size > settings.IMPORT_MAX_BYTES:
+            return Response({"error": f"The file is larger than {settings.IMPORT_MAX_BYTES} bytes"},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        format = request.data.get('format') or ('csv' if upload.name.lower().endswith('.csv') else 'ndjson')
+        if format not in IMPORT_FORMATS:
+            return Response({"error": f"Format must be one of {', '.join(IMPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = AdventureImporter(request.user).run(upload.file, format)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
     def filtered(self, request):
@@ -119,9 +222,9 @@ class AdventureViewSet(viewsets.ModelViewSet):
                 queryset |= Adventure.objects.filter(
                     type=adventure_type, user_id=request.user.id)
 
-        queryset = self.apply_sorting(queryset)
-        adventures = self.paginate_and_respond(queryset, request)
-        return adventures
+        validators = queryset_validators(request.user, queryset)
+        queryset = self.prepare_queryset(self.apply_sorting(queryset))
+        return conditional_response(request, validators, lambda: self.paginate_and_respond(queryset, request))
     
     @action(detail=False, methods=['get'])
     def all(self, request):
@@ -144,9 +247,14 @@ class AdventureViewSet(viewsets.ModelViewSet):
             Q(user_id=request.user.id) & Q(type__in=allowed_types)
         )
         
-        queryset = self.apply_sorting(queryset)
+        validators = queryset_validators(request.user, queryset)
+        queryset = self.prepare_queryset(self.apply_sorting(queryset))
+        return conditional_response(request, validators, lambda: self.build_all(queryset, request))
+
+    def build_all(self, queryset, request):
+        if use_keyset_pagination(request):
+            return paginate_keyset(self, queryset, request)
         serializer = self.get_serializer(queryset, many=True)
-       
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
@@ -187,17 +295,47 @@ class AdventureViewSet(viewsets.ModelViewSet):
                 (Q(user_id=request.user.id) | Q(is_public=True))
             )
         else:
-            queryset = Adventure.objects.filter(
-            (Q(name__icontains=query) | Q(description__icontains=query) | Q(location__icontains=query) | Q(activity_types__icontains=query)) &
+            return self.ranked_search(request, query)
+        
+        queryset = self.prepare_queryset(self.apply_sorting(queryset))
+        return self.paginate_and_respond(queryset, request)
+
+    def ranked_search(self, request, query):
+        """
+        Full-text search over the weighted `search_vector` (name > location > activity
+        types > description) combined with trigram similarity on name and location for
+        typo tolerance. Results are ordered by relevance unless `order_by` is given, and
+        are always paginated (`page`, `page_size` or a cursor). Highlights are built for
+        the rows of the page only.
+        """
+        terms = re.findall(r'\w+', query.lower())
+        # prefix match every term so results update while the user is typing
+        if terms:
+            search_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='english')
+        else:
+            search_query = SearchQuery(query, search_type='plain', config='english')
+
+        queryset = Adventure.objects.filter(
+            (Q(search_vector=search_query) | Q(name__trigram_similar=query) | Q(location__trigram_similar=query)) &
             (Q(user_id=request.user.id) | Q(is_public=True))
+        ).annotate(
+            rank=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query),
         )
-        
-        queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+
+        if 'order_by' in request.query_params:
+            queryset = self.apply_sorting(queryset)
+        else:
+            queryset = queryset.order_by('-rank')
+        queryset = self.prepare_queryset(queryset)
+
+        paginator = KeysetPagination() if use_keyset_pagination(request) else self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        add_highlights(page, search_query)
+        serializer = AdventureSearchSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
 
     def paginate_and_respond(self, queryset, request):
-        paginator = self.pagination_class()
+        paginator = KeysetPagination() if use_keyset_pagination(request) else self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -213,6 +351,17 @@ class CollectionViewSet(viewsets.ModelViewSet):
     # def get_queryset(self):
     #     return Collection.objects.filter(Q(user_id=self.request.user.id) & Q(is_archived=False))
 
+    def prepare_queryset(self, queryset):
+        # prefetch the rendered children and defer columns left out by ?fields= / ?omit=
+        queryset = self.get_serializer_class().setup_eager_loading(queryset, self.request)
+        return self.get_serializer().sparse_queryset(queryset)
+
+    def get_serializer_class(self):
+        # ?view=summary returns lightweight cards for the listings, full payloads are only sent on retrieve
+        if self.action in ['list', 'all', 'archived'] and self.request.query_params.get('view') == 'summary':
+            return CollectionSummarySerializer
+        return CollectionSerializer
+
     def apply_sorting(self, queryset):
         order_by = self.request.query_params.get('order_by', 'name')
         order_direction = self.request.query_params.get('order_direction', 'asc')
@@ -244,10 +393,17 @@ class CollectionViewSet(viewsets.ModelViewSet):
         # make sure the user is authenticated
         if not request.user.is_authenticated:
             return Response({"error": "User is not authenticated"}, status=400)
-        queryset = self.get_queryset()
+        validators = collection_validators(request.user, self.get_queryset())
+        queryset = self.prepare_queryset(self.get_queryset())
         queryset = self.apply_sorting(queryset)
-        collections = self.paginate_and_respond(queryset, request)
-        return collections
+        return conditional_response(request, validators, lambda: self.paginate_and_respond(queryset, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = Collection.objects.filter(Q(is_public=True) | Q(user_id=request.user.id)).filter(pk=kwargs['pk'])
+        validators = collection_validators(request.user, queryset)
+        return conditional_response(request, validators, lambda: cached_response(
+            request, 'collection', [collection_scope(kwargs['pk'])],
+            lambda: super(CollectionViewSet, self).retrieve(request, *args, **kwargs)))
     
     @action(detail=False, methods=['get'])
     def all(self, request):
@@ -258,10 +414,10 @@ class CollectionViewSet(viewsets.ModelViewSet):
             Q(user_id=request.user.id)
         )
         
+        validators = collection_validators(request.user, queryset)
+        queryset = self.prepare_queryset(queryset)
         queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
-       
-        return Response(serializer.data)
+        return conditional_response(request, validators, lambda: Response(self.get_serializer(queryset, many=True).data))
     
     @action(detail=False, methods=['get'])
     def archived(self, request):
@@ -272,14 +428,20 @@ class CollectionViewSet(viewsets.ModelViewSet):
             Q(user_id=request.user.id) & Q(is_archived=True)
         )
         
+        validators = collection_validators(request.user, queryset)
+        queryset = self.prepare_queryset(queryset)
         queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
-       
-        return Response(serializer.data)
+        return conditional_response(request, validators, lambda: Response(self.get_serializer(queryset, many=True).data))
     
     # this make the is_public field of the collection cascade to the adventures
     @transaction.atomic
     def update(self, request, *args, **kwargs):
+        # If-Match gives clients optimistic concurrency on edits
+        validator_queryset = Collection.objects.filter(user_id=request.user.id, pk=kwargs['pk'])
+        response = precondition_failed(request, collection_validators(request.user, validator_queryset))
+        if response is not None:
+            return response
+
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
@@ -288,15 +450,19 @@ class CollectionViewSet(viewsets.ModelViewSet):
         # Check if the 'is_public' field is present in the update data
         if 'is_public' in serializer.validated_data:
             new_public_status = serializer.validated_data['is_public']
-            
+
+            # queryset updates send no signals, drop the cached adventures explicitly
+            adventure_ids = Adventure.objects.filter(collection=instance).values_list('id', flat=True)
+            invalidate(*[adventure_scope(pk) for pk in adventure_ids])
+
             # Update associated adventures to match the collection's is_public status
-            Adventure.objects.filter(collection=instance).update(is_public=new_public_status)
+            Adventure.objects.filter(collection=instance).update(is_public=new_public_status, updated_at=timezone.now())
 
             # do the same for transportations
-            Transportation.objects.filter(collection=instance).update(is_public=new_public_status)
+            Transportation.objects.filter(collection=instance).update(is_public=new_public_status, updated_at=timezone.now())
 
             # do the same for notes
-            Note.objects.filter(collection=instance).update(is_public=new_public_status)
+            Note.objects.filter(collection=instance).update(is_public=new_public_status, updated_at=timezone.now())
 
             # Log the action (optional)
             action = "public" if new_public_status else "private"
@@ -309,7 +475,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
             # forcibly invalidate the prefetch cache on the instance.
             instance._prefetched_objects_cache = {}
 
-        return Response(serializer.data)
+        return set_validator_headers(Response(serializer.data), collection_validators(request.user, validator_queryset))
 
     def get_queryset(self):
         if self.action == 'destroy':
@@ -319,9 +485,9 @@ class CollectionViewSet(viewsets.ModelViewSet):
             return Collection.objects.filter(user_id=self.request.user.id)
         
         if self.action == 'retrieve':
-            return Collection.objects.filter(
+            return self.prepare_queryset(Collection.objects.filter(
                 Q(is_public=True) | Q(user_id=self.request.user.id)
-            )
+            ))
         
         # For other actions (like list), only include user's non-archived collections
         return Collection.objects.filter(
@@ -332,7 +498,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
         serializer.save(user_id=self.request.user)
     
     def paginate_and_respond(self, queryset, request):
-        paginator = self.pagination_class()
+        paginator = KeysetPagination() if use_keyset_pagination(request) else self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -345,26 +511,19 @@ class StatsViewSet(viewsets.ViewSet):
 
     @action(detail=False, methods=['get'])
     def counts(self, request):
-        visited_count = Adventure.objects.filter(
-            type='visited', user_id=request.user.id).count()
-        planned_count = Adventure.objects.filter(
-            type='planned', user_id=request.user.id).count()
-        trips_count = Collection.objects.filter(
-            user_id=request.user.id).count()
-        visited_region_count = VisitedRegion.objects.filter(
-            user_id=request.user.id).count()
-        total_regions = Region.objects.count()
-        country_count = VisitedRegion.objects.filter(
-            user_id=request.user.id).values('region__country').distinct().count()
-        total_countries = Country.objects.count()
+        scopes = [user_stats_scope(request.user.id), CATALOG_SCOPE]
+        return cached_response(request, 'stats', scopes, lambda: self.build_counts(request))
+
+    def build_counts(self, request):
+        stats = get_user_stats(request.user.id)
         return Response({
-            'visited_count': visited_count,
-            'planned_count': planned_count,
-            'trips_count': trips_count,
-            'visited_region_count': visited_region_count,
-            'total_regions': total_regions,
-            'country_count': country_count,
-            'total_countries': total_countries
+            'visited_count': stats.visited_count,
+            'planned_count': stats.planned_count,
+            'trips_count': stats.trips_count,
+            'visited_region_count': stats.visited_region_count,
+            'total_regions': catalog_totals()['total_regions'],
+            'country_count': stats.country_count,
+            'total_countries': catalog_totals()['total_countries']
         })
     
 class GenerateDescription(viewsets.ViewSet):
@@ -375,14 +534,11 @@ class GenerateDescription(viewsets.ViewSet):
         name = self.request.query_params.get('name', '')
         # un url encode the name
         name = name.replace('%20', ' ')
-        print(name)
-        url = 'https://en.wikipedia.org/w/api.php?origin=*&action=query&prop=extracts&exintro&explaintext&format=json&titles=%s' % name
-        response = requests.get(url)
-        data = response.json()
-        data = response.json()
-        page_id = next(iter(data["query"]["pages"]))
-        extract = data["query"]["pages"][page_id]
-        if extract.get('extract') is None:
+        try:
+            extract = wikipedia.description(name)
+        except WikipediaUnavailable as e:
+            return Response({"error": str(e)}, status=503)
+        if extract is None:
             return Response({"error": "No description found"}, status=400)
         return Response(extract)
     @action(detail=False, methods=['get'],)
@@ -390,14 +546,52 @@ class GenerateDescription(viewsets.ViewSet):
         name = self.request.query_params.get('name', '')
         # un url encode the name
         name = name.replace('%20', ' ')
-        url = 'https://en.wikipedia.org/w/api.php?origin=*&action=query&prop=pageimages&format=json&piprop=original&titles=%s' % name
-        response = requests.get(url)
-        data = response.json()
-        page_id = next(iter(data["query"]["pages"]))
-        extract = data["query"]["pages"][page_id]
-        if extract.get('original') is None:
+        try:
+            image = wikipedia.image(name)
+        except WikipediaUnavailable as e:
+            return Response({"error": str(e)}, status=503)
+        if image is None:
             return Response({"error": "No image found"}, status=400)
-        return Response(extract["original"])
+
+        # ?size= serves a local resized copy instead of the (often huge) original
+        size = self.request.query_params.get('size')
+        if size is None and not settings.WIKIPEDIA_MIRROR_IMAGES:
+            return Response(image)
+        size = size or 'full'
+        if size not in MIRROR_WIDTHS:
+            return Response({"error": f"Invalid size. Use one of: {', '.join(MIRROR_WIDTHS)}"}, status=400)
+        return Response(mirrored_image(image, size))
+
+
+class ExportViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """
+        Stream a full account export as NDJSON (`?export_format=ndjson`, the default) or as
+        a ZIP with the images included (`?export_format=zip`). `?entity=` and `?offset=`
+        resume an interrupted export from the given entity type and position.
+        """
+        # not `format`, which DRF reserves for choosing a renderer
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in ['ndjson', 'zip']:
+            return Response({"error": "Format must be ndjson or zip"}, status=status.HTTP_400_BAD_REQUEST)
+        entity = request.query_params.get('entity')
+        if entity is not None and entity not in EXPORT_ENTITY_NAMES:
+            return Response({"error": f"Entity must be one of {', '.join(EXPORT_ENTITY_NAMES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({"error": "Offset must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = f"adventurelog-export-{request.user.username}-{timezone.now():%Y%m%d}"
+        if export_format == 'zip':
+            response = StreamingHttpResponse(iter_zip(request.user, entity, offset), content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+        else:
+            response = StreamingHttpResponse(iter_records(request.user, entity, offset), content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.ndjson"'
+        return response
 
 
 class ActivityTypesView(viewsets.ViewSet):
@@ -408,24 +602,44 @@ class ActivityTypesView(viewsets.ViewSet):
         """
         Retrieve a list of distinct activity types for adventures associated with the current user.
 
+        The tags are unnested and grouped in Postgres, most used first. `?prefix=` narrows
+        the list for autocomplete and `?detail=true` returns each tag with its usage
+        count and last-used date instead of the plain list of names.
+
         Args:
             request (HttpRequest): The HTTP request object.
 
         Returns:
             Response: A response containing a list of distinct activity types.
         """
-        types = Adventure.objects.filter(user_id=request.user.id).values_list('activity_types', flat=True).distinct()
-
-        allTypes = []
-
-        for i in types:
-            if not i:
-                continue
-            for x in i:
-                if x and x not in allTypes:
-                    allTypes.append(x)
-
-        return Response(allTypes)
+        return cached_response(request, 'activity-types', [user_adventures_scope(request.user.id)],
+                               lambda: self.build_types(request))
+
+    def build_types(self, request):
+        prefix = request.query_params.get('prefix', '')
+        sql = """
+            SELECT tag, COUNT(*) AS count, MAX(COALESCE(a.end_date, a.date, a.created_at::date)) AS last_used
+            FROM adventures_adventure a
+            CROSS JOIN LATERAL unnest(a.activity_types) AS tag
+            WHERE a.user_id_id = %s AND a.activity_types IS NOT NULL AND tag <> ''
+        """
+        params = [request.user.id]
+        if prefix:
+            sql += " AND tag ILIKE %s"
+            # escape LIKE wildcards so the prefix is matched literally
+            params.append(prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        sql += " GROUP BY tag ORDER BY count DESC, tag"
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        if request.query_params.get('detail') == 'true':
+            return Response([
+                {'name': tag, 'count': count, 'last_used': last_used}
+                for tag, count, last_used in rows
+            ])
+        return Response([tag for tag, _, _ in rows])
 
 class TransportationViewSet(viewsets.ModelViewSet):
     queryset = Transportation.objects.all()
@@ -446,6 +660,8 @@ class TransportationViewSet(viewsets.ModelViewSet):
         queryset = Transportation.objects.filter(
             Q(user_id=request.user.id)
         )
+        if use_keyset_pagination(request):
+            return paginate_keyset(self, queryset.order_by('-updated_at'), request)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -481,6 +697,8 @@ class NoteViewSet(viewsets.ModelViewSet):
         queryset = Note.objects.filter(
             Q(user_id=request.user.id)
         )
+        if use_keyset_pagination(request):
+            return paginate_keyset(self, queryset.order_by('-updated_at'), request)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -516,6 +734,8 @@ class ChecklistViewSet(viewsets.ModelViewSet):
         queryset = Checklist.objects.filter(
             Q(user_id=request.user.id)
         )
+        if use_keyset_pagination(request):
+            return paginate_keyset(self, queryset.order_by('-updated_at'), request)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -0,0 +1,169 @@
+import hashlib
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import RESPONSE_CACHE
+
+# cached entries are kept this long past their TTL so they can be served while
+# Wikipedia is unreachable
+STALE_TTL = 7 * 24 * 60 * 60
+
+
+class WikipediaUnavailable(Exception):
+    pass
+
+
+def canonical_title(title):
+    """
+    The title as MediaWiki normalizes it: underscores and runs of whitespace become one
+    space and the first letter is upper case. The rest stays case sensitive.
+    """
+    title = re.sub(r'[\s_]+', ' ', title).strip()
+    return title[:1].upper() + title[1:]
+
+
+class _Call:
+    # one in-flight upstream request that concurrent lookups of the same title wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class WikipediaClient:
+    """
+    Wikipedia page extract and image lookups for GenerateDescription.
+
+    - One keep-alive `requests.Session` with connect/read timeouts.
+    - Results, including "not found", are cached in the shared response cache for
+      WIKIPEDIA_CACHE_TTL / WIKIPEDIA_NEGATIVE_CACHE_TTL seconds, for every worker.
+    - Concurrent lookups of the same title in this process share one upstream call.
+    - After WIKIPEDIA_BREAKER_THRESHOLD consecutive failures no calls are made for
+      WIKIPEDIA_BREAKER_COOLDOWN seconds. Expired entries are served meanwhile, and
+      WikipediaUnavailable is raised when there is nothing cached.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+        self.session.headers['User-Agent'] = 'AdventureLog (https://github.com/seanmorley15/AdventureLog)'
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.failures = 0
+        self.opened_at = None
+
+    def description(self, title):
+        """
+        The page object with its intro `extract`, or None when there is none.
+        """
+        return self.lookup('desc', title, {'prop': 'extracts', 'exintro': 1, 'explaintext': 1}, 'extract')
+
+    def image(self, title):
+        """
+        The page image as {'source', 'width', 'height'}, or None when there is none.
+        """
+        page = self.lookup('img', title, {'prop': 'pageimages', 'piprop': 'original'}, 'original')
+        return page['original'] if page else None
+
+    def lookup(self, kind, title, params, required):
+        title = canonical_title(title)
+        key = f'wikipedia:{kind}:{hashlib.md5(title.encode("utf-8")).hexdigest()}'
+        entry = caches[RESPONSE_CACHE].get(key)
+        if entry is not None and entry['expires'] > time.time():
+            return entry['value']
+        if not self.allow_request():
+            if entry is not None:
+                return entry['value']
+            raise WikipediaUnavailable('Wikipedia is temporarily unavailable')
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            connect_timeout, read_timeout = settings.WIKIPEDIA_TIMEOUT
+            if not call.done.wait(connect_timeout + read_timeout + 1):
+                raise WikipediaUnavailable('Wikipedia lookup timed out')
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self.fetch(key, title, params, required, entry)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+        return call.value
+
+    def fetch(self, key, title, params, required, entry):
+        query = {'origin': '*', 'action': 'query', 'format': 'json', 'titles': title, **params}
+        try:
+            response = self.session.get(settings.WIKIPEDIA_API_URL, params=query, timeout=settings.WIKIPEDIA_TIMEOUT)
+            response.raise_for_status()
+            pages = response.json()['query']['pages']
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            self.record_failure()
+            if entry is not None:
+                return entry['value']
+            raise WikipediaUnavailable(f'Wikipedia lookup failed: {e}')
+        self.record_success()
+
+        page = next(iter(pages.values()), None)
+        value = page if page and page.get(required) is not None else None
+        ttl = settings.WIKIPEDIA_CACHE_TTL if value is not None else settings.WIKIPEDIA_NEGATIVE_CACHE_TTL
+        caches[RESPONSE_CACHE].set(key, {'value': value, 'expires': time.time() + ttl}, ttl + STALE_TTL)
+        return value
+
+    def download(self, url):
+        """
+        The body of `url` (an image linked from a page), at most WIKIPEDIA_MIRROR_MAX_BYTES.
+        """
+        try:
+            with self.session.get(url, timeout=settings.WIKIPEDIA_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > settings.WIKIPEDIA_MIRROR_MAX_BYTES:
+                        raise WikipediaUnavailable(f'{url} is larger than {settings.WIKIPEDIA_MIRROR_MAX_BYTES} bytes')
+                    chunks.append(chunk)
+        except requests.RequestException as e:
+            raise WikipediaUnavailable(f'Downloading {url} failed: {e}')
+        return b''.join(chunks)
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < settings.WIKIPEDIA_BREAKER_COOLDOWN:
+                return False
+            # half open: let this one through, a failure re-opens for another cooldown
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= settings.WIKIPEDIA_BREAKER_THRESHOLD:
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+
+wikipedia = WikipediaClient()
@@ -45,6 +45,7 @@ INSTALLED_APPS = (
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'dj_rest_auth',
@@ -80,10 +81,30 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # cached API responses, shared by all workers and nodes (see adventures/cache.py).
+    # The database backend needs `manage.py createcachetable`, any other backend such
+    # as FileBasedCache or Redis can be configured instead.
+    'responses': {
+        'BACKEND': getenv('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': getenv('RESPONSE_CACHE_LOCATION', 'response_cache'),
+        'TIMEOUT': 24 * 60 * 60,
+    },
 }
 
 
+# Wikipedia lookups for generated descriptions and images, see adventures/wikipedia.py
+WIKIPEDIA_API_URL = getenv('WIKIPEDIA_API_URL', 'https://en.wikipedia.org/w/api.php')
+WIKIPEDIA_TIMEOUT = (3.05, 5)  # connect, read
+WIKIPEDIA_CACHE_TTL = 24 * 60 * 60
+WIKIPEDIA_NEGATIVE_CACHE_TTL = 60 * 60
+WIKIPEDIA_BREAKER_THRESHOLD = 5
+WIKIPEDIA_BREAKER_COOLDOWN = 30
+# store resized copies of page images instead of returning Wikipedia's original URL
+WIKIPEDIA_MIRROR_IMAGES = getenv('WIKIPEDIA_MIRROR_IMAGES', 'False') == 'True'
+WIKIPEDIA_MIRROR_MAX_BYTES = 50 * 1024 * 1024
+
+
 # For backwards compatibility for Django 1.8
 MIDDLEWARE_CLASSES = MIDDLEWARE
 
@@ -135,8 +156,23 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_ROOT = BASE_DIR / "staticfiles"
 STATIC_URL = '/static/'
 
+# digest of the country/region catalog, written by worldtravel-seed (see worldtravel/catalog.py)
+CATALOG_VERSION_FILE = getenv('CATALOG_VERSION_FILE', os.path.join(BASE_DIR, 'catalog-version'))
+
+# combined GeoJSON built from static/data (see worldtravel/geojson.py)
+GEOJSON_BUILD_DIR = getenv('GEOJSON_BUILD_DIR', os.path.join(BASE_DIR, 'geojson-build'))
+
+# per-user vector tile cache (see worldtravel/tiles.py)
+TILE_CACHE_DIR = getenv('TILE_CACHE_DIR', os.path.join(BASE_DIR, 'tile-cache'))
+TILE_MAX_ZOOM = int(getenv('TILE_MAX_ZOOM', 16))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# how /media/ files are sent after the access check: 'django' streams them itself,
+# 'accel' hands them to nginx (X-Accel-Redirect), 'sendfile' to Apache/lighttpd (X-Sendfile)
+MEDIA_DELIVERY = getenv('MEDIA_DELIVERY', 'django')
+# internal nginx location aliasing MEDIA_ROOT, see proxy/nginx.conf
+MEDIA_ACCEL_PREFIX = getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 
@@ -171,12 +207,31 @@ REST_AUTH = {
 DISABLE_REGISTRATION = getenv('DISABLE_REGISTRATION', 'False') == 'True'
 DISABLE_REGISTRATION_MESSAGE = getenv('DISABLE_REGISTRATION_MESSAGE', 'Registration is disabled. Please contact the administrator if you need an account.')
 
+# 'thread' processes uploaded images on an in-process pool, 'worker' leaves them
+# for the `process-images` management command
+IMAGE_PROCESSING_MODE = getenv('IMAGE_PROCESSING_MODE', 'thread')
+IMAGE_PROCESSING_WORKERS = int(getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+# mark the regions of visited adventures after every adventure write, on the image
+# processing pool, so only with IMAGE_PROCESSING_MODE 'thread' (see worldtravel/lookup.py)
+REGION_CHECK_AUTO = getenv('REGION_CHECK_AUTO', 'False') == 'True'
+
+# largest CSV/NDJSON file accepted by the adventure import endpoint; the
+# `import-adventures` command reads files of any size
+IMPORT_MAX_BYTES = int(getenv('IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+
+# resolve coordinates to regions in memory instead of in the database, and fill in
+# blank adventure locations (see worldtravel/geocoder.py)
+REVERSE_GEOCODER = getenv('REVERSE_GEOCODER', 'False') == 'True'
+REVERSE_GEOCODER_MAX_VERTICES = int(getenv('REVERSE_GEOCODER_MAX_VERTICES', 2000000))
+
 STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
     "default": {
-        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        # uploads are stored once per content hash, see adventures/storage.py
+        "BACKEND": "adventures.storage.ContentAddressedStorage",
     }
 }
 
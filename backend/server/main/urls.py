@@ -1,9 +1,8 @@
 from django.urls import include, re_path, path
 from django.contrib import admin
 from django.views.generic import RedirectView, TemplateView
-from django.conf import settings
-from django.conf.urls.static import static
 from adventures import urls as adventures
+from adventures.media import serve_media
 from users.views import ChangeEmailView, IsRegistrationDisabled
 from .views import get_csrf_token
 from drf_yasg.views import get_schema_view
@@ -69,4 +68,6 @@ urlpatterns = [
     re_path(r'^docs/$', schema_view.with_ui('swagger',
             cache_timeout=0), name='api_docs'),
     # path('auth/account-confirm-email/', VerifyEmailView.as_view(), name='account_email_verification_sent'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # access checked, see adventures/media.py
+    re_path(r'^media/(?P<path>.+)$', serve_media, name='media'),
+]
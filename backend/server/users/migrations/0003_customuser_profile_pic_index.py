@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_customuser_profile_pic'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_pic',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='profile-pics/'),
+        ),
+    ]
@@ -1,10 +1,10 @@
 import uuid
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django_resized import ResizedImageField
 
 class CustomUser(AbstractUser):
-    profile_pic = ResizedImageField(force_format="WEBP", quality=75, null=True, blank=True, upload_to='profile-pics/')
+    # stored as uploaded, downscaled to WEBP in the background (see adventures/images.py)
+    profile_pic = models.ImageField(null=True, blank=True, upload_to='profile-pics/', db_index=True)
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     
     def __str__(self):
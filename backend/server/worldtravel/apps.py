@@ -1,6 +1,15 @@
+import sys
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class WorldtravelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'worldtravel'
+
+    def ready(self):
+        # only where requests are served, not in migrate, worldtravel-seed and the like
+        serving = not sys.argv[0].endswith('manage.py') or sys.argv[1:2] == ['runserver']
+        if settings.REVERSE_GEOCODER and serving:
+            from .geocoder import start_geocoder
+            start_geocoder()
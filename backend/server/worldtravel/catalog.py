@@ -0,0 +1,232 @@
+import gzip
+import hashlib
+import os
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from adventures.cache import CATALOG_SCOPE, RESPONSE_CACHE, invalidate
+from .geojson import build_geojson
+from .models import Country, Region
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOG_TOTALS_CACHE_KEY = 'worldtravel:catalog_totals'
+
+
+def catalog_totals():
+    """
+    Country and region totals only change when `worldtravel-seed` runs, which calls
+    `invalidate_catalog`, so they are cached without a timeout. They live in the shared
+    response cache, so every worker sees the invalidation.
+    """
+    cache = caches[RESPONSE_CACHE]
+    totals = cache.get(CATALOG_TOTALS_CACHE_KEY)
+    if totals is None:
+        totals = {
+            'total_regions': Region.objects.count(),
+            'total_countries': Country.objects.count(),
+        }
+        cache.set(CATALOG_TOTALS_CACHE_KEY, totals, None)
+    return totals
+
+
+def invalidate_catalog_totals():
+    caches[RESPONSE_CACHE].delete(CATALOG_TOTALS_CACHE_KEY)
+    invalidate(CATALOG_SCOPE)
+
+
+# degrees of ST_SimplifyPreserveTopology tolerance per column, roughly 5 km and 500 m
+SIMPLIFIED_GEOMETRY_TOLERANCES = {
+    'geometry_low': 0.05,
+    'geometry_medium': 0.005,
+}
+
+
+def _only(region_ids, column):
+    # SQL condition and params restricting a statement to `region_ids`, None for all
+    if region_ids is None:
+        return 'TRUE', []
+    return f'{column} = ANY(%s)', [list(region_ids)]
+
+
+def simplify_region_geometries(region_ids=None):
+    """
+    Fills the simplified geometry columns from `geometry`, of every region or only of
+    `region_ids`.
+    """
+    if region_ids is not None and not region_ids:
+        return
+    columns = ', '.join(f'{column} = ST_Multi(ST_SimplifyPreserveTopology(geometry, {tolerance}))'
+                        for column, tolerance in SIMPLIFIED_GEOMETRY_TOLERANCES.items())
+    condition, params = _only(region_ids, 'id')
+    with connection.cursor() as cursor:
+        cursor.execute(f'UPDATE worldtravel_region SET {columns} WHERE {condition}', params)
+
+
+# vertices per RegionPart polygon
+REGION_PART_MAX_VERTICES = 256
+
+
+def subdivide_regions(region_ids=None):
+    """
+    Rebuilds the RegionPart rows of every region or only of `region_ids`.
+    """
+    if region_ids is not None and not region_ids:
+        return
+    with connection.cursor() as cursor:
+        condition, params = _only(region_ids, 'region_id')
+        cursor.execute(f'DELETE FROM worldtravel_regionpart WHERE {condition}', params)
+        condition, params = _only(region_ids, 'id')
+        cursor.execute(f"""
+            INSERT INTO worldtravel_regionpart (region_id, geometry)
+            SELECT id, (ST_Dump(ST_Subdivide(geometry, %s))).geom
+            FROM worldtravel_region
+            WHERE geometry IS NOT NULL AND {condition}
+        """, [REGION_PART_MAX_VERTICES, *params])
+
+
+def invalidate_catalog(region_ids=None, geojson=True):
+    """
+    Rebuilds what is derived from the country and region tables. The derived region
+    rows are written in the current transaction, for every region or only `region_ids`
+    (empty after a delete, which cascades). The caches, the version stamp, the GeoJSON
+    files (only needed when countries changed) and the geocoder follow once it commits,
+    so a rollback leaves them alone.
+    """
+    simplify_region_geometries(region_ids)
+    subdivide_regions(region_ids)
+    transaction.on_commit(lambda: _catalog_committed(geojson))
+
+
+def _catalog_committed(geojson):
+    invalidate_catalog_totals()
+    stamp_catalog_version()
+    if geojson:
+        # continents may have changed
+        build_geojson()
+    # other processes notice the new version on their own, see geocoder.start_geocoder
+    from .geocoder import refresh_geocoder
+    refresh_geocoder()
+
+
+# The catalog version is a digest of the country and region tables, written to
+# CATALOG_VERSION_FILE whenever the catalog changes. Workers only stat that file to
+# notice a new version, so serving the catalog needs no database access.
+
+def compute_catalog_version():
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT md5(coalesce(string_agg(concat_ws('|', id, name, country_code, continent), ',' ORDER BY id), ''))
+            FROM worldtravel_country
+        """)
+        countries = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT md5(coalesce(string_agg(concat_ws('|', id, name, name_en, country_id, md5(ST_AsBinary(geometry))), ',' ORDER BY id), ''))
+            FROM worldtravel_region
+        """)
+        regions = cursor.fetchone()[0]
+    return hashlib.md5(f'{countries}|{regions}'.encode('utf-8')).hexdigest()[:16]
+
+
+def stamp_catalog_version():
+    version = compute_catalog_version()
+    path = settings.CATALOG_VERSION_FILE
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, path)
+    return version
+
+
+_lock = threading.Lock()
+_version = {'mtime': None, 'value': None}
+_payloads = {}
+
+
+def catalog_version():
+    try:
+        mtime = os.stat(settings.CATALOG_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        # never stamped, e.g. seeded before versioning existed
+        with _lock:
+            return stamp_catalog_version()
+    if _version['mtime'] != mtime:
+        with open(settings.CATALOG_VERSION_FILE) as f:
+            value = f.read().strip()
+        with _lock:
+            _version.update(mtime=mtime, value=value)
+    return _version['value']
+
+
+class Payload:
+    """
+    One rendered catalog response in every encoding we send, with a strong ETag.
+    """
+
+    def __init__(self, version, name, data):
+        self.body = JSONRenderer().render(data)
+        self.etag = f'"{version}-{hashlib.md5(name.encode("utf-8")).hexdigest()[:8]}"'
+        self.encoded = {'gzip': gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(self.body)
+
+
+def _countries():
+    from .serializers import CountrySerializer
+    return CountrySerializer(Country.objects.order_by('id'), many=True).data
+
+
+def _serialized_regions(regions, geometry):
+    from .serializers import RegionSerializer
+    context = {'geometry': geometry}
+    regions = RegionSerializer(context=context).sparse_queryset(regions)
+    return RegionSerializer(regions, many=True, context=context).data
+
+
+def _regions(geometry):
+    return _serialized_regions(Region.objects.order_by('id'), geometry)
+
+
+def _country_regions(country_code, geometry):
+    country = Country.objects.filter(country_code=country_code).first()
+    if country is None:
+        return None
+    return _serialized_regions(Region.objects.filter(country=country).order_by('name'), geometry)
+
+
+def catalog_payload(name, version=None, geometry=None):
+    """
+    The pre-serialized payload `name` ('countries', 'regions' or 'regions:<code>') of
+    the current catalog version, built on first use and then held in memory until the
+    version changes. Regions carry geometry only at a requested resolution
+    ('low', 'medium' or 'full'). None when there is no such country.
+    """
+    version = version or catalog_version()
+    if geometry:
+        name = f'{name}@{geometry}'
+    key = (version, name)
+    payload = _payloads.get(key)
+    if payload is not None:
+        return payload
+    with _lock:
+        payload = _payloads.get(key)
+        if payload is not None:
+            return payload
+        if name == 'countries':
+            data = _countries()
+        elif name.startswith('regions:'):
+            data = _country_regions(name.split('@')[0].split(':', 1)[1], geometry)
+        else:
+            data = _regions(geometry)
+        if data is None:
+            return None
+        for stale in [k for k in _payloads if k[0] != version]:
+            del _payloads[stale]
+        payload = _payloads[key] = Payload(version, name, data)
+    return payload
@@ -0,0 +1,183 @@
+import logging
+import math
+import resource
+import threading
+import time
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import connection
+
+from .catalog import catalog_version
+from .models import Region, RegionPart
+
+logger = logging.getLogger(__name__)
+
+# degrees per side of a grid cell; RegionPart pieces are small, so most cells hold a few
+GRID_CELL = 1.0
+# seconds between the background builder's checks for a new catalog version
+REBUILD_INTERVAL = 30
+
+
+class GeocoderTooLarge(Exception):
+    pass
+
+
+def _max_rss_kb():
+    # peak resident size of the process, in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class ReverseGeocoder:
+    """
+    Resolves coordinates to regions in memory: the RegionPart pieces of one catalog
+    version as prepared GEOS geometries, found through a grid of GRID_CELL degree cells
+    and their bounding boxes. Refuses to build past REVERSE_GEOCODER_MAX_VERTICES.
+    """
+
+    def __init__(self, version):
+        started, rss_before = time.perf_counter(), _max_rss_kb()
+        self.version = version
+        self.regions = {}
+        self.labels = {}
+        regions = Region.objects.values_list('id', 'name', 'name_en', 'country__country_code', 'country__name')
+        for region_id, name, name_en, country_code, country_name in regions.iterator():
+            self.regions[region_id] = {'region_id': region_id, 'region_name': name,
+                                       'country_code': country_code, 'country_name': country_name}
+            self.labels[region_id] = f'{name_en or name}, {country_name}'
+
+        self.parts = []
+        self.grid = {}
+        vertices = 0
+        for region_id, geometry in RegionPart.objects.values_list('region_id', 'geometry').iterator(chunk_size=500):
+            vertices += geometry.num_coords
+            if vertices > settings.REVERSE_GEOCODER_MAX_VERTICES:
+                raise GeocoderTooLarge(f'more than {settings.REVERSE_GEOCODER_MAX_VERTICES} vertices')
+            xmin, ymin, xmax, ymax = geometry.extent
+            prepared = geometry.prepared
+            # GEOS builds the prepared index on first use, here rather than racing in requests
+            prepared.intersects(Point(xmin, ymin, srid=4326))
+            index = len(self.parts)
+            self.parts.append((xmin, ymin, xmax, ymax, prepared, region_id))
+            for x in range(math.floor(xmin / GRID_CELL), math.floor(xmax / GRID_CELL) + 1):
+                for y in range(math.floor(ymin / GRID_CELL), math.floor(ymax / GRID_CELL) + 1):
+                    self.grid.setdefault((x, y), []).append(index)
+
+        self.stats = {
+            'catalog_version': version,
+            'regions': len(self.regions),
+            'parts': len(self.parts),
+            'vertices': vertices,
+            'cells': len(self.grid),
+            'cell_entries': sum(len(entries) for entries in self.grid.values()),
+            # coordinates alone; GEOS and the prepared indexes add to this
+            'coordinate_bytes': vertices * 16,
+            # exact in a fresh process (reverse-geocoder-stats), a lower bound otherwise
+            'peak_rss_growth_kb': _max_rss_kb() - rss_before,
+            'build_seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def _region_id(self, lat, lon):
+        lat, lon = float(lat), float(lon)
+        candidates = self.grid.get((math.floor(lon / GRID_CELL), math.floor(lat / GRID_CELL)))
+        if not candidates:
+            return None
+        point = None
+        for index in candidates:
+            xmin, ymin, xmax, ymax, prepared, region_id = self.parts[index]
+            if xmin <= lon <= xmax and ymin <= lat <= ymax:
+                if point is None:
+                    point = Point(lon, lat, srid=4326)
+                # intersects like the database lookups, see lookup.py
+                if prepared.intersects(point):
+                    return region_id
+        return None
+
+    def resolve(self, lat, lon):
+        """
+        The region and country of a point, like lookup.regions_for_points, or None.
+        """
+        region_id = self._region_id(lat, lon)
+        return dict(self.regions[region_id]) if region_id is not None else None
+
+    def label(self, lat, lon):
+        """
+        'Region, Country' for a point, or None outside every region.
+        """
+        region_id = self._region_id(lat, lon)
+        return self.labels[region_id] if region_id is not None else None
+
+
+_lock = threading.Lock()
+_current = {'version': None, 'geocoder': None}
+_started = threading.Event()
+
+
+def _build(version):
+    with _lock:
+        if _current['version'] != version:
+            try:
+                geocoder = ReverseGeocoder(version)
+                logger.info('Reverse geocoder built: %s', geocoder.stats)
+            except GeocoderTooLarge as e:
+                logger.warning('Reverse geocoder disabled for catalog %s: %s', version, e)
+                geocoder = None
+            _current.update(version=version, geocoder=geocoder)
+
+
+def get_geocoder():
+    """
+    The geocoder of the current catalog version, or None when REVERSE_GEOCODER is off
+    or the catalog is too large. With `start_geocoder` running, a newer version is left
+    to its thread and the previous geocoder keeps answering meanwhile; otherwise it is
+    built on first use.
+    """
+    if not settings.REVERSE_GEOCODER:
+        return None
+    version = catalog_version()
+    if _current['version'] != version and (_current['version'] is None or not _started.is_set()):
+        _build(version)
+    return _current['geocoder']
+
+
+def refresh_geocoder():
+    """
+    Rebuilds this process's geocoder for the current catalog version, if it has one.
+    """
+    if settings.REVERSE_GEOCODER and _current['version'] is not None:
+        _build(catalog_version())
+
+
+def _keep_built():
+    while True:
+        try:
+            _build(catalog_version())
+        except Exception:
+            logger.exception('Reverse geocoder build failed')
+        finally:
+            # the thread only needs the database while building
+            connection.close()
+        time.sleep(REBUILD_INTERVAL)
+
+
+def start_geocoder():
+    """
+    Builds the geocoder in a background thread at startup, and again whenever
+    `invalidate_catalog` stamps a new catalog version, so requests do not wait for it.
+    """
+    if not _started.is_set():
+        _started.set()
+        threading.Thread(target=_keep_built, name='reverse-geocoder', daemon=True).start()
+
+
+def fill_location(adventure):
+    """
+    Sets a blank `location` from the adventure's coordinates. Returns True if it did.
+    """
+    if adventure.location or adventure.latitude is None or adventure.longitude is None:
+        return False
+    geocoder = get_geocoder()
+    label = geocoder.label(adventure.latitude, adventure.longitude) if geocoder else None
+    if label is None:
+        return False
+    adventure.location = label
+    return True
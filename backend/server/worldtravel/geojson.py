@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+from .models import Country
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+
+_lock = threading.Lock()
+_manifest = {'mtime': None, 'value': None}
+
+
+def _source_files():
+    data_dir = finders.find('data')
+    if not data_dir or not os.path.isdir(data_dir):
+        return data_dir, []
+    return data_dir, sorted(f for f in os.listdir(data_dir) if f.endswith('.json'))
+
+
+def source_signature():
+    # file names, sizes and mtimes of static/data, to notice a changed source set
+    data_dir, files = _source_files()
+    parts = []
+    for filename in files:
+        stat = os.stat(os.path.join(data_dir, filename))
+        parts.append(f'{filename}:{stat.st_size}:{stat.st_mtime_ns}')
+    parts.append(json.dumps(sorted(Country.objects.values_list('country_code', 'continent'))))
+    return hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _features(json_data):
+    if isinstance(json_data, dict) and 'type' in json_data:
+        if json_data['type'] == 'FeatureCollection':
+            return json_data.get('features', [])
+        if json_data['type'] == 'Feature':
+            return [json_data]
+    return []
+
+
+def _write_variant(build_dir, name, features):
+    body = json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':')).encode('utf-8')
+    encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body)
+    files = {}
+    for encoding, content in encodings.items():
+        filename = f'{name}.json' + {'identity': '', 'gzip': '.gz', 'br': '.br'}[encoding]
+        # replaced atomically, other workers may be sending the previous build
+        tmp = os.path.join(build_dir, f'{filename}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, os.path.join(build_dir, filename))
+        files[encoding] = filename
+    return {'etag': f'"{hashlib.md5(body).hexdigest()}"', 'files': files}
+
+
+def build_geojson():
+    """
+    Combines the country files in static/data once into `all`, `country-<code>` and
+    `continent-<code>` FeatureCollections, each written as JSON, gzip and brotli (when
+    installed) to GEOJSON_BUILD_DIR with a manifest of their ETags.
+    """
+    data_dir, files = _source_files()
+    if data_dir is None:
+        raise FileNotFoundError('Data directory does not exist.')
+    continents = {code.lower(): continent for code, continent in Country.objects.values_list('country_code', 'continent')}
+    signature = source_signature()
+
+    by_country = {}
+    for filename in files:
+        with open(os.path.join(data_dir, filename)) as f:
+            by_country[filename[:-len('.json')].lower()] = _features(json.load(f))
+
+    build_dir = settings.GEOJSON_BUILD_DIR
+    os.makedirs(build_dir, exist_ok=True)
+    variants = {'all': _write_variant(build_dir, 'all', [f for features in by_country.values() for f in features])}
+    by_continent = {}
+    for code, features in by_country.items():
+        variants[f'country-{code}'] = _write_variant(build_dir, f'country-{code}', features)
+        if code in continents:
+            by_continent.setdefault(continents[code], []).extend(features)
+    for continent, features in by_continent.items():
+        variants[f'continent-{continent.lower()}'] = _write_variant(build_dir, f'continent-{continent.lower()}', features)
+
+    tmp = os.path.join(build_dir, f'{MANIFEST}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'signature': signature, 'variants': variants}, f)
+    os.replace(tmp, os.path.join(build_dir, MANIFEST))
+    return variants
+
+
+def geojson_manifest():
+    """
+    The manifest of the built variants, reloaded when a new build replaces it. Built
+    here on first use when missing or when static/data changed since the last build.
+    """
+    path = os.path.join(settings.GEOJSON_BUILD_DIR, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime is not None and _manifest['mtime'] == mtime:
+        return _manifest['value']
+
+    with _lock:
+        manifest = None
+        if mtime is not None:
+            with open(path) as f:
+                manifest = json.load(f)
+        if manifest is None or manifest['signature'] != source_signature():
+            build_geojson()
+            mtime = os.stat(path).st_mtime_ns
+            with open(path) as f:
+                manifest = json.load(f)
+        _manifest.update(mtime=mtime, value=manifest)
+    return manifest
+
+
+def geojson_variant(name):
+    """
+    {'etag', 'files': {encoding: path}} of a built variant, or None if there is none.
+    """
+    variant = geojson_manifest()['variants'].get(name)
+    if variant is None:
+        return None
+    return {
+        'etag': variant['etag'],
+        'files': {encoding: os.path.join(settings.GEOJSON_BUILD_DIR, filename)
+                  for encoding, filename in variant['files'].items()},
+    }
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from adventures.cache import invalidate, user_visits_scope
+from adventures.images import schedule
+from adventures.stats import refresh_user_stats, region_counts
+from .catalog import catalog_version
+from .geocoder import get_geocoder
+from .models import RegionCheckpoint
+
+# Points are matched against the subdivided RegionPart pieces. ST_Intersects rather
+# than ST_Contains, so a point on an edge between two pieces of one region still matches.
+
+# the most points one lookup request may resolve
+MAX_POINTS = 5000
+
+POINTS_SQL = """
+    SELECT r.id, r.name, c.country_code, c.name
+    FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS p(lon, lat, ord)
+    LEFT JOIN LATERAL (
+        SELECT r.id, r.name, r.country_id
+        FROM worldtravel_regionpart part
+        JOIN worldtravel_region r ON r.id = part.region_id
+        WHERE ST_Intersects(part.geometry, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326))
+        LIMIT 1
+    ) r ON true
+    LEFT JOIN worldtravel_country c ON c.id = r.country_id
+    ORDER BY p.ord
+"""
+
+
+def regions_for_points(points):
+    """
+    Resolves (lat, lon) pairs to their region in one spatial join, or in memory when
+    the reverse geocoder is on. Returns one dict per point, in input order, with the
+    region and country or None outside every region.
+    """
+    if not points:
+        return []
+    geocoder = get_geocoder()
+    if geocoder is not None:
+        return [geocoder.resolve(lat, lon) for lat, lon in points]
+    return query_regions_for_points(points)
+
+
+def query_regions_for_points(points):
+    with connection.cursor() as cursor:
+        cursor.execute(POINTS_SQL, [[lon for _, lon in points], [lat for lat, _ in points]])
+        rows = cursor.fetchall()
+    return [
+        {'region_id': region_id, 'region_name': region_name, 'country_code': country_code, 'country_name': country_name}
+        if region_id is not None else None
+        for region_id, region_name, country_code, country_name in rows
+    ]
+
+
+# Adventures saved shortly before a run may commit after it, so every run also looks
+# back this far. Rows found twice are skipped by the unique constraint.
+REGION_CHECK_OVERLAP = timedelta(minutes=5)
+
+CHECK_SQL = """
+    INSERT INTO worldtravel_visitedregion (user_id_id, region_id)
+    SELECT DISTINCT a.user_id_id, part.region_id
+    FROM adventures_adventure a
+    JOIN worldtravel_regionpart part
+      ON ST_Intersects(part.geometry, ST_SetSRID(ST_MakePoint(a.longitude::float8, a.latitude::float8), 4326))
+    WHERE a.user_id_id = %(user_id)s AND a.type = 'visited'
+      AND a.latitude IS NOT NULL AND a.longitude IS NOT NULL
+      AND (%(since)s::timestamptz IS NULL OR a.updated_at >= %(since)s::timestamptz)
+    ON CONFLICT (user_id_id, region_id) DO NOTHING
+"""
+
+
+def check_user_regions(user_id, full=False):
+    """
+    Marks the regions of the user's visited adventures as visited in one spatial join.
+    Only adventures updated since the last run are considered, unless `full` is set or
+    the catalog changed since then. Returns the number of newly visited regions.
+    """
+    version = catalog_version()
+    with transaction.atomic():
+        # also keeps two runs for the same user from overlapping
+        checkpoint, _ = RegionCheckpoint.objects.select_for_update().get_or_create(user_id=user_id)
+        since = None
+        if not full and checkpoint.checked_at and checkpoint.catalog_version == version:
+            since = checkpoint.checked_at - REGION_CHECK_OVERLAP
+        started = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(CHECK_SQL, {'user_id': user_id, 'since': since})
+            count = cursor.rowcount
+        checkpoint.checked_at = started
+        checkpoint.catalog_version = version
+        checkpoint.save()
+        if count:
+            # the insert bypasses the VisitedRegion signals
+            refresh_user_stats(user_id, region_counts)
+            invalidate(user_visits_scope(user_id))
+    return count
+
+
+def queue_region_check(user_id):
+    """
+    With REGION_CHECK_AUTO on, runs check_user_regions for the user in the background
+    once the current transaction commits.
+    """
+    if settings.REGION_CHECK_AUTO:
+        schedule(check_user_regions, user_id)
@@ -0,0 +1,97 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from worldtravel.catalog import subdivide_regions
+from worldtravel.models import Country, RegionPart
+
+FULL_SQL = """
+    SELECT id FROM worldtravel_region
+    WHERE ST_Contains(geometry, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+    LIMIT 1
+"""
+
+PARTS_SQL = """
+    SELECT region_id FROM worldtravel_regionpart
+    WHERE ST_Intersects(geometry, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+    LIMIT 1
+"""
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Compares point-in-region lookup latency on the full region geometries and the subdivided RegionPart table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--points',
+            type=int,
+            default=5,
+            help='Random points sampled inside each region (default: 5)'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the RegionPart table before measuring'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild'] or not RegionPart.objects.exists():
+            subdivide_regions()
+
+        self.stdout.write(f'{"country":<24}{"points":>7}{"full p50":>11}{"full p95":>11}'
+                          f'{"parts p50":>11}{"parts p95":>11}{"speedup":>9}')
+        all_full, all_parts, mismatches = [], [], 0
+        for country in Country.objects.order_by('name'):
+            points = self.sample_points(country.id, options['points'])
+            if not points:
+                continue
+            full, full_regions = self.measure(FULL_SQL, points)
+            parts, part_regions = self.measure(PARTS_SQL, points)
+            mismatches += sum(1 for a, b in zip(full_regions, part_regions) if a != b)
+            all_full += full
+            all_parts += parts
+            self.report(country.name, full, parts)
+
+        if not all_full:
+            self.stdout.write(self.style.WARNING('No region geometries to benchmark, run worldtravel-seed first.'))
+            return
+        self.report('all countries', all_full, all_parts)
+        if mismatches:
+            # points on a shared border may resolve to either neighbour
+            self.stdout.write(self.style.WARNING(f'{mismatches} points resolved to a different region'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{RegionPart.objects.count()} region parts, times in milliseconds per lookup'))
+
+    def sample_points(self, country_id, per_region):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT ST_X(point.geom), ST_Y(point.geom)
+                FROM worldtravel_region r,
+                     LATERAL ST_Dump(ST_GeneratePoints(r.geometry, %s)) point
+                WHERE r.country_id = %s AND r.geometry IS NOT NULL
+            """, [per_region, country_id])
+            return cursor.fetchall()
+
+    def measure(self, sql, points):
+        timings, regions = [], []
+        with connection.cursor() as cursor:
+            # warm up the plan and the buffer cache
+            cursor.execute(sql, points[0])
+            cursor.fetchone()
+            for lon, lat in points:
+                start = time.perf_counter()
+                cursor.execute(sql, [lon, lat])
+                row = cursor.fetchone()
+                timings.append((time.perf_counter() - start) * 1000)
+                regions.append(row[0] if row else None)
+        return timings, regions
+
+    def report(self, name, full, parts):
+        speedup = statistics.median(full) / statistics.median(parts) if statistics.median(parts) else 0
+        self.stdout.write(f'{name[:23]:<24}{len(full):>7}{statistics.median(full):>11.3f}{percentile(full, 0.95):>11.3f}'
+                          f'{statistics.median(parts):>11.3f}{percentile(parts, 0.95):>11.3f}{speedup:>8.1f}x')
@@ -0,0 +1,58 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from worldtravel.catalog import catalog_version
+from worldtravel.geocoder import GeocoderTooLarge, ReverseGeocoder
+from worldtravel.lookup import query_regions_for_points
+
+
+class Command(BaseCommand):
+    help = 'Builds the in-memory reverse geocoder and reports its memory footprint and lookup latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n', '--lookups',
+            type=int,
+            default=10000,
+            help='Random points to resolve for the latency measurement (default: 10000)'
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also resolve the points in the database and count disagreements'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            geocoder = ReverseGeocoder(catalog_version())
+        except GeocoderTooLarge as e:
+            self.stdout.write(self.style.ERROR(f'Catalog too large for the reverse geocoder: {e}'))
+            return
+        for key, value in geocoder.stats.items():
+            self.stdout.write(f'{key:<20}{value}')
+        if not geocoder.parts:
+            self.stdout.write(self.style.WARNING('No region geometries loaded, run worldtravel-seed first.'))
+            return
+
+        # points inside the seeded regions' bounding boxes, so most of them hit a region
+        points = []
+        for _ in range(options['lookups']):
+            xmin, ymin, xmax, ymax, _, _ = random.choice(geocoder.parts)
+            points.append((random.uniform(ymin, ymax), random.uniform(xmin, xmax)))
+
+        start = time.perf_counter()
+        results = [geocoder.resolve(lat, lon) for lat, lon in points]
+        elapsed = time.perf_counter() - start
+        hits = sum(1 for result in results if result)
+        self.stdout.write(f'{"lookups":<20}{len(points)} ({hits} in a region)')
+        self.stdout.write(f'{"per lookup":<20}{elapsed / len(points) * 1e6:.1f} µs')
+
+        if options['compare']:
+            expected = []
+            for start in range(0, len(points), 5000):
+                expected += query_regions_for_points(points[start:start + 5000])
+            mismatches = sum(1 for a, b in zip(results, expected)
+                             if (a or {}).get('region_id') != (b or {}).get('region_id'))
+            # points on a shared border may resolve to either neighbour
+            self.stdout.write(f'{"database mismatches":<20}{mismatches}')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -3,6 +3,8 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 import requests
 from worldtravel.models import Country, Region
+from worldtravel.catalog import invalidate_catalog
+from worldtravel.tiles import defer_tile_invalidation
 from django.db import transaction
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon
 from django.contrib.gis.geos.error import GEOSException
@@ -631,14 +633,15 @@ class Command(BaseCommand):
             return
 
         try:
-            with transaction.atomic():
+            with transaction.atomic(), defer_tile_invalidation():
                 if force:
                     self.sync_countries(countries)
                     self.sync_regions(regions)
                 else:
                     self.insert_countries(countries)
                     self.insert_regions(regions)
-                
+
+                transaction.on_commit(invalidate_catalog)
                 self.stdout.write(self.style.SUCCESS('Successfully imported world travel data'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error importing data: {str(e)}'))
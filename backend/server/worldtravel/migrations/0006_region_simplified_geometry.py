@@ -0,0 +1,32 @@
+# Generated by Django 5.0.8 on 2026-10-18 14:20
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worldtravel', '0005_remove_country_geometry_region_geometry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='geometry_low',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='geometry_medium',
+            field=django.contrib.gis.db.models.fields.MultiPolygonField(blank=True, editable=False, null=True, srid=4326),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE worldtravel_region SET
+                geometry_low = ST_Multi(ST_SimplifyPreserveTopology(geometry, 0.05)),
+                geometry_medium = ST_Multi(ST_SimplifyPreserveTopology(geometry, 0.005))
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.8 on 2026-10-18 15:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worldtravel', '0006_region_simplified_geometry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # keep the first visit of each user and region before enforcing uniqueness
+        migrations.RunSQL(
+            """
+            DELETE FROM worldtravel_visitedregion a
+            USING worldtravel_visitedregion b
+            WHERE a.user_id_id = b.user_id_id AND a.region_id = b.region_id AND a.id > b.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='visitedregion',
+            constraint=models.UniqueConstraint(fields=('user_id', 'region'), name='unique_visited_region'),
+        ),
+        migrations.CreateModel(
+            name='RegionCheckpoint',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='region_checkpoint', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('checked_at', models.DateTimeField(blank=True, null=True)),
+                ('catalog_version', models.CharField(blank=True, default='', max_length=32)),
+            ],
+        ),
+    ]
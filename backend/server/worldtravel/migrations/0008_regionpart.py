@@ -0,0 +1,32 @@
+# Generated by Django 5.0.8 on 2026-10-18 15:40
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worldtravel', '0007_visitedregion_unique_regioncheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geometry', django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='worldtravel.region')),
+            ],
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO worldtravel_regionpart (region_id, geometry)
+            SELECT id, (ST_Dump(ST_Subdivide(geometry, 256))).geom
+            FROM worldtravel_region
+            WHERE geometry IS NOT NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -50,16 +50,36 @@ class Region(models.Model):
     name_en = models.CharField(max_length=100, blank=True, null=True)
     country = models.ForeignKey(Country, on_delete=models.CASCADE)
     geometry = gis_models.MultiPolygonField(srid=4326, null=True, blank=True)
+    # simplified copies of `geometry` for listings, see catalog.simplify_region_geometries
+    geometry_low = gis_models.MultiPolygonField(srid=4326, null=True, blank=True, editable=False)
+    geometry_medium = gis_models.MultiPolygonField(srid=4326, null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
+class RegionPart(models.Model):
+    """
+    A piece of a region's geometry with a bounded number of vertices (ST_Subdivide),
+    rebuilt from `Region.geometry` with the catalog. Point lookups test these small
+    polygons through their GiST index instead of the full coastline MultiPolygons.
+    """
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='parts')
+    geometry = gis_models.PolygonField(srid=4326)
+
+    def __str__(self):
+        return f'Part of {self.region_id}'
+
 class VisitedRegion(models.Model):
     id = models.AutoField(primary_key=True)
     user_id = models.ForeignKey(
         User, on_delete=models.CASCADE, default=default_user_id)
     region = models.ForeignKey(Region, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'region'], name='unique_visited_region'),
+        ]
+
     def __str__(self):
         return f'{self.region.name} ({self.region.country.country_code}) visited by: {self.user_id.username}'
     
@@ -67,3 +87,16 @@ class VisitedRegion(models.Model):
         if VisitedRegion.objects.filter(user_id=self.user_id, region=self.region).exists():
             raise ValidationError("Region already visited by user.")
         super().save(*args, **kwargs)
+
+
+class RegionCheckpoint(models.Model):
+    """
+    How far `check_user_regions` got for a user: adventures updated before
+    `checked_at` were already matched against the catalog of `catalog_version`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='region_checkpoint')
+    checked_at = models.DateTimeField(null=True, blank=True)
+    catalog_version = models.CharField(max_length=32, blank=True, default='')
+
+    def __str__(self):
+        return f'Region check for user {self.user_id} at {self.checked_at}'
@@ -1,9 +1,11 @@
 import os
 from .models import Country, Region, VisitedRegion
+from django.db.models import Exists, OuterRef
 from rest_framework import serializers
+from adventures.serializers import SparseFieldsMixin
 
 
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     def get_public_url(self, obj):
         return os.environ.get('PUBLIC_URL', 'http://127.0.0.1:8000').rstrip('/').replace("'", "")
 
@@ -18,13 +20,77 @@ class CountrySerializer(serializers.ModelSerializer):
         fields = '__all__'  # Serialize all fields of the Adventure model
         read_only_fields = ['id', 'name', 'country_code', 'continent', 'flag_url']
 
-class RegionSerializer(serializers.ModelSerializer):
+# ?geometry= resolution -> the Region column it is read from
+GEOMETRY_COLUMNS = {
+    'low': 'geometry_low',
+    'medium': 'geometry_medium',
+    'full': 'geometry',
+}
+
+
+def geometry_resolution(value):
+    if value in (None, '', 'none'):
+        return None
+    if value not in GEOMETRY_COLUMNS:
+        raise serializers.ValidationError({'geometry': f'Must be one of: {", ".join(GEOMETRY_COLUMNS)}.'})
+    return value
+
+
+class RegionFieldsSerializer(serializers.ModelSerializer):
+    """
+    Regions without their MultiPolygon unless `?geometry=low|medium|full` (or a
+    `geometry` context entry) asks for it, plus the requesting user's `visited` flag.
+    Kept below SparseFieldsMixin so `?fields=` sees the final `geometry` field.
+    """
+    visited = serializers.SerializerMethodField()
+
+    def _resolution(self):
+        if 'geometry' in self.context:
+            return self.context['geometry']
+        request = self.context.get('request')
+        return geometry_resolution(request.query_params.get('geometry')) if request else None
+
+    def _user(self):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        geometry = {column: fields.pop(column, None) for column in GEOMETRY_COLUMNS.values()}
+        resolution = self._resolution()
+        if resolution and geometry[GEOMETRY_COLUMNS[resolution]] is not None:
+            field = geometry[GEOMETRY_COLUMNS[resolution]]
+            field.source = GEOMETRY_COLUMNS[resolution]
+            fields['geometry'] = field
+        if self._user() is None:
+            # shared catalog payloads are the same for everyone
+            fields.pop('visited', None)
+        return fields
+
+    def get_visited(self, obj):
+        if hasattr(obj, 'visited'):
+            return obj.visited
+        return VisitedRegion.objects.filter(region=obj, user_id=self._user().id).exists()
+
+
+class RegionSerializer(SparseFieldsMixin, RegionFieldsSerializer):
     class Meta:
         model = Region
         fields = '__all__'  # Serialize all fields of the Adventure model
-        read_only_fields = ['id', 'name', 'country', 'name_en', 'geometry']
+        read_only_fields = ['id', 'name', 'country', 'name_en', 'geometry', 'visited']
+
+    def sparse_queryset(self, queryset):
+        queryset = super().sparse_queryset(queryset)
+        resolution = self._resolution()
+        queryset = queryset.defer(*[column for name, column in GEOMETRY_COLUMNS.items() if name != resolution])
+        user = self._user()
+        if user is not None:
+            queryset = queryset.annotate(visited=Exists(
+                VisitedRegion.objects.filter(region=OuterRef('pk'), user_id=user.id)))
+        return queryset
 
-class VisitedRegionSerializer(serializers.ModelSerializer):
+class VisitedRegionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = VisitedRegion
         fields = '__all__'  # Serialize all fields of the Adventure model
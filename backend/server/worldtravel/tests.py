@@ -1,3 +1,166 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from adventures.models import Adventure
+from .catalog import invalidate_catalog, stamp_catalog_version, subdivide_regions
+from .geocoder import ReverseGeocoder, get_geocoder, refresh_geocoder
+from .models import Country, Region, RegionPart, VisitedRegion
+from .tiles import clear_tiles, defer_tile_invalidation, invalidate_region_tiles, tile_range
+
+User = get_user_model()
+
+
+def create_regions():
+    # TL-A covers 0-10 east, TL-B 10-20 east, both 0-10 north; lookups read the RegionPart pieces
+    country = Country.objects.create(name='Testland', country_code='tl', continent='EU')
+    for code, x in (('TL-A', 0), ('TL-B', 10)):
+        Region.objects.create(id=code, name=code, name_en=f'Region {code[-1]}', country=country,
+                              geometry=MultiPolygon(Polygon.from_bbox((x, 0, x + 10, 10)), srid=4326))
+    subdivide_regions()
+
+
+class TileCacheTests(TestCase):
+    def test_tile_range_covers_extent(self):
+        self.assertEqual(tile_range((-180, -85, 180, 85), 0), (0, 0, 0, 0))
+        # Iceland at zoom 4
+        self.assertEqual(tile_range((-24.5, 63.3, -13.5, 66.6), 4), (6, 7, 3, 4))
+
+    def test_region_invalidation_only_removes_overlapping_tiles(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(TILE_CACHE_DIR=root):
+            tiles = {(4, 6, 4): 'iceland', (4, 15, 15): 'elsewhere'}
+            for (z, x, y) in tiles:
+                os.makedirs(os.path.join(root, '1', 'token', str(z), str(x)))
+                open(os.path.join(root, '1', 'token', str(z), str(x), f'{y}.mvt'), 'wb').close()
+
+            invalidate_region_tiles([(-24.5, 63.3, -13.5, 66.6)])
+
+            self.assertFalse(os.path.exists(os.path.join(root, '1', 'token', '4', '6', '4.mvt')))
+            self.assertTrue(os.path.exists(os.path.join(root, '1', 'token', '4', '15', '15.mvt')))
+
+    def test_seeding_clears_tiles_once(self):
+        with self.captureOnCommitCallbacks() as callbacks, defer_tile_invalidation():
+            country = Country.objects.create(name='Testland', country_code='tl', continent='EU')
+            for code in ('TL-A', 'TL-B'):
+                region = Region.objects.create(id=code, name=code, country=country)
+                region.name_en = code
+                region.save()
+
+        self.assertEqual(callbacks, [clear_tiles])
+
+
+class PointLookupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='lookup', password='password'))
+        create_regions()
+
+    def test_points_are_resolved_in_order(self):
+        points = [{'lat': 5, 'lon': 15}, {'lat': 50, 'lon': 50}, {'lat': 5, 'lon': 5}]
+        response = self.client.post('/api/countries/check_points_in_regions/', {'points': points}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r.get('region_id') for r in results], ['TL-B', None, 'TL-A'])
+        self.assertEqual(results[0]['country_code'], 'tl')
+        self.assertFalse(results[1]['in_region'])
+
+    def test_invalid_points_are_rejected(self):
+        response = self.client.post('/api/countries/check_points_in_regions/',
+                                    {'points': [{'lat': 95, 'lon': 0}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RegionCheckTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='regions', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        create_regions()
+
+    def check(self, **params):
+        response = self.client.post('/api/countries/region_check_all_adventures/' + ('?full=true' if params else ''))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['regions_visited']
+
+    def test_only_new_regions_are_inserted(self):
+        for lon in (5, 6):
+            Adventure.objects.create(user_id=self.user, type='visited', name='A', latitude=5, longitude=lon)
+        Adventure.objects.create(user_id=self.user, type='planned', name='Planned', latitude=5, longitude=15)
+
+        self.assertEqual(self.check(), 1)
+        self.assertEqual(self.check(), 0)
+
+        Adventure.objects.create(user_id=self.user, type='visited', name='B', latitude=5, longitude=15)
+        self.assertEqual(self.check(), 1)
+        self.assertEqual(set(VisitedRegion.objects.filter(user_id=self.user).values_list('region_id', flat=True)),
+                         {'TL-A', 'TL-B'})
+
+    def test_full_check_restores_removed_visits(self):
+        Adventure.objects.create(user_id=self.user, type='visited', name='A', latitude=5, longitude=5)
+        # older than the overlap every incremental run looks back
+        Adventure.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.check(), 1)
+        VisitedRegion.objects.filter(user_id=self.user).delete()
+
+        self.assertEqual(self.check(), 0)
+        self.assertEqual(self.check(full=True), 1)
+
+
+class ReverseGeocoderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='geocoder', password='password')
+        create_regions()
+
+    def test_resolves_like_the_database(self):
+        geocoder = ReverseGeocoder('test')
+
+        self.assertEqual(geocoder.resolve(5, 15)['region_id'], 'TL-B')
+        self.assertEqual(geocoder.resolve(5, 5)['country_code'], 'tl')
+        self.assertIsNone(geocoder.resolve(50, 50))
+        self.assertEqual(geocoder.label(5, 5), 'Region A, Testland')
+        self.assertEqual(geocoder.stats['regions'], 2)
+
+    def test_blank_locations_are_filled_in(self):
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(REVERSE_GEOCODER=True, CATALOG_VERSION_FILE=os.path.join(root, 'version')):
+            filled = Adventure.objects.create(user_id=self.user, type='visited', name='A', latitude=5, longitude=15)
+            kept = Adventure.objects.create(user_id=self.user, type='visited', name='B', location='Home',
+                                            latitude=5, longitude=15)
+
+        self.assertEqual(filled.location, 'Region B, Testland')
+        self.assertEqual(kept.location, 'Home')
+
+    def test_rebuilt_for_a_new_catalog_version(self):
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(REVERSE_GEOCODER=True, CATALOG_VERSION_FILE=os.path.join(root, 'version')):
+            stamp_catalog_version()
+            before = get_geocoder()
+            Region.objects.filter(pk='TL-A').update(name_en='Renamed')
+            stamp_catalog_version()
+            refresh_geocoder()
+
+            self.assertEqual(before.label(5, 5), 'Region A, Testland')
+            self.assertEqual(get_geocoder().label(5, 5), 'Renamed, Testland')
+
+
+class CatalogInvalidationTests(TestCase):
+    def setUp(self):
+        create_regions()
+
+    def test_only_changed_regions_are_derived_again(self):
+        untouched = set(RegionPart.objects.filter(region_id='TL-B').values_list('pk', flat=True))
+        Region.objects.filter(pk='TL-A').update(geometry=MultiPolygon(Polygon.from_bbox((0, 0, 5, 5)), srid=4326))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_catalog(['TL-A'], geojson=False)
+
+        self.assertEqual(RegionPart.objects.get(region_id='TL-A').geometry.extent, (0, 0, 5, 5))
+        self.assertEqual(set(RegionPart.objects.filter(region_id='TL-B').values_list('pk', flat=True)), untouched)
+        # caches, version stamp and files wait for the commit
+        self.assertEqual(len(callbacks), 1)
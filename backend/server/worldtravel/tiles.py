@@ -0,0 +1,199 @@
+import hashlib
+import math
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, transaction
+
+from adventures.cache import scope_tokens, user_adventures_scope, user_visits_scope
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# half the width of the web mercator world, in meters
+MERCATOR_MAX = 20037508.342789244
+MAX_LATITUDE = 85.0511287798
+
+# Tiles are cached on disk per user as TILE_CACHE_DIR/<user id>/<token>/<z>/<x>/<y>.mvt.
+# The token comes from the user's visit and adventure cache scopes (see
+# adventures/cache.py), so any write that drops those responses also starts a new
+# tile directory. Region edits delete the cached tiles they overlap for every user.
+
+TILE_SQL = """
+    WITH bounds AS (
+        SELECT geom, ST_Transform(ST_Expand(geom, (ST_XMax(geom) - ST_XMin(geom)) * %(buffer)s / %(extent)s), 4326) AS wgs84
+        FROM (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom) envelope
+    ), regions AS (
+        SELECT r.id, r.name, c.country_code,
+               EXISTS (SELECT 1 FROM worldtravel_visitedregion v
+                       WHERE v.region_id = r.id AND v.user_id_id = %(user_id)s) AS visited,
+               ST_AsMVTGeom(ST_Simplify(ST_Transform(r.geometry, 3857), %(tolerance)s),
+                            bounds.geom, %(extent)s, %(buffer)s, true) AS geom
+        FROM worldtravel_region r
+        JOIN worldtravel_country c ON c.id = r.country_id
+        CROSS JOIN bounds
+        WHERE r.geometry && bounds.wgs84
+    ), adventures AS (
+        SELECT a.id::text AS id, a.name, a.type, a.is_public,
+               ST_AsMVTGeom(ST_Transform(point, 3857), bounds.geom, %(extent)s, %(buffer)s, true) AS geom
+        FROM (SELECT id, name, type, is_public,
+                     ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326) AS point
+              FROM adventures_adventure
+              WHERE user_id_id = %(user_id)s AND latitude IS NOT NULL AND longitude IS NOT NULL) a
+        CROSS JOIN bounds
+        WHERE a.point && bounds.wgs84
+    )
+    SELECT coalesce((SELECT ST_AsMVT(regions, 'regions', %(extent)s, 'geom') FROM regions WHERE geom IS NOT NULL), ''::bytea)
+        || coalesce((SELECT ST_AsMVT(adventures, 'adventures', %(extent)s, 'geom') FROM adventures WHERE geom IS NOT NULL), ''::bytea)
+"""
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= settings.TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_tolerance(z):
+    # one pixel of a 256px tile at this zoom, in meters; finer detail is not visible
+    return 2 * MERCATOR_MAX / (256 * 2 ** z)
+
+
+def render_tile(user_id, z, x, y):
+    with connection.cursor() as cursor:
+        cursor.execute(TILE_SQL, {
+            'z': z, 'x': x, 'y': y, 'user_id': user_id,
+            'extent': TILE_EXTENT, 'buffer': TILE_BUFFER, 'tolerance': tile_tolerance(z),
+        })
+        return bytes(cursor.fetchone()[0])
+
+
+def user_tile_token(user_id):
+    tokens = scope_tokens([user_visits_scope(user_id), user_adventures_scope(user_id)])
+    return hashlib.md5('|'.join(tokens).encode('utf-8')).hexdigest()[:12]
+
+
+def _user_dir(user_id, token):
+    user_dir = os.path.join(settings.TILE_CACHE_DIR, str(user_id))
+    token_dir = os.path.join(user_dir, token)
+    if not os.path.isdir(token_dir):
+        # tiles of earlier tokens are never read again
+        if os.path.isdir(user_dir):
+            for name in os.listdir(user_dir):
+                if name != token:
+                    _remove_tree(os.path.join(user_dir, name))
+        os.makedirs(token_dir, exist_ok=True)
+    return token_dir
+
+
+def cached_tile(user_id, z, x, y):
+    """
+    Returns (path, token) of the user's tile, rendering and storing it on first use.
+    """
+    token = user_tile_token(user_id)
+    path = os.path.join(_user_dir(user_id, token), str(z), str(x), f'{y}.mvt')
+    if not os.path.exists(path):
+        tile = render_tile(user_id, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(tile)
+        os.replace(tmp, path)
+    return path, token
+
+
+def _remove_tree(path):
+    # renamed first so a concurrent request never reads from a half deleted directory
+    trash = f'{path}.{uuid.uuid4().hex}.deleted'
+    try:
+        os.rename(path, trash)
+    except FileNotFoundError:
+        return
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def clear_tiles():
+    root = settings.TILE_CACHE_DIR
+    if os.path.isdir(root):
+        for name in os.listdir(root):
+            _remove_tree(os.path.join(root, name))
+
+
+def _tile_x(lon, z):
+    return min(max(int((lon + 180) / 360 * 2 ** z), 0), 2 ** z - 1)
+
+
+def _tile_y(lat, z):
+    lat = math.radians(min(max(lat, -MAX_LATITUDE), MAX_LATITUDE))
+    y = (1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * 2 ** z
+    return min(max(int(y), 0), 2 ** z - 1)
+
+
+def tile_range(extent, z):
+    """
+    The (x_min, x_max, y_min, y_max) tile numbers covering a lon/lat extent at zoom z.
+    """
+    xmin, ymin, xmax, ymax = extent
+    return _tile_x(xmin, z), _tile_x(xmax, z), _tile_y(ymax, z), _tile_y(ymin, z)
+
+
+def _numbered(path, suffix=''):
+    # entries named <n><suffix>, skipping temporary files of tiles being written
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    numbers = [name[:len(name) - len(suffix)] for name in names if name.endswith(suffix)]
+    return [(int(number), f'{number}{suffix}') for number in numbers if number.isdigit()]
+
+
+def invalidate_region_tiles(extents):
+    """
+    Deletes every cached tile, of every user, that overlaps one of the lon/lat extents
+    (xmin, ymin, xmax, ymax). Only walks tiles that exist, so it stays cheap at high zooms.
+    """
+    extents = [extent for extent in extents if extent]
+    root = settings.TILE_CACHE_DIR
+    if not extents or not os.path.isdir(root):
+        return
+    for user in os.listdir(root):
+        user_dir = os.path.join(root, user)
+        for token in os.listdir(user_dir) if os.path.isdir(user_dir) else []:
+            for z, z_name in _numbered(os.path.join(user_dir, token)):
+                ranges = [tile_range(extent, z) for extent in extents]
+                z_dir = os.path.join(user_dir, token, z_name)
+                for x, x_name in _numbered(z_dir):
+                    x_dir = os.path.join(z_dir, x_name)
+                    for y, y_name in _numbered(x_dir, '.mvt'):
+                        if any(x0 <= x <= x1 and y0 <= y <= y1 for x0, x1, y0, y1 in ranges):
+                            try:
+                                os.remove(os.path.join(x_dir, y_name))
+                            except FileNotFoundError:
+                                pass
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_tile_invalidation():
+    """
+    Skips the per-row tile invalidation of the Region and Country signals inside the
+    block and clears every cached tile once instead, when the transaction commits. For
+    bulk catalog writes like `worldtravel-seed`, which also set geometries with queryset
+    updates that send no signals.
+    """
+    if getattr(_deferred, 'active', False):
+        yield
+        return
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = False
+    transaction.on_commit(clear_tiles)
+
+
+def tile_invalidation_deferred():
+    return getattr(_deferred, 'active', False)
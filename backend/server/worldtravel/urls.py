@@ -2,7 +2,7 @@
 
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import CountryViewSet, RegionViewSet, VisitedRegionViewSet, regions_by_country, visits_by_country, GeoJSONView
+from .views import CountryViewSet, RegionViewSet, VisitedRegionViewSet, regions_by_country, visits_by_country, GeoJSONView, catalog_index, versioned_catalog, tile
 
 router = DefaultRouter()
 router.register(r'countries', CountryViewSet, basename='countries')
@@ -11,7 +11,12 @@ router.register(r'visitedregion', VisitedRegionViewSet, basename='visitedregion'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('catalog/', catalog_index, name='catalog'),
+    path('catalog/<str:version>/countries/', versioned_catalog, {'name': 'countries'}, name='catalog-countries'),
+    path('catalog/<str:version>/regions/', versioned_catalog, {'name': 'regions'}, name='catalog-regions'),
+    path('catalog/<str:version>/<str:country_code>/regions/', versioned_catalog, {'name': 'regions'}, name='catalog-country-regions'),
     path('<str:country_code>/regions/', regions_by_country, name='regions-by-country'),
     path('<str:country_code>/visits/', visits_by_country, name='visits-by-country'),
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', tile, name='tile'),
     path('geojson/', GeoJSONView.as_view({'get': 'list'}), name='geojson'),
 ]
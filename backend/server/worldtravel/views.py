@@ -1,6 +1,5 @@
-from django.shortcuts import render
 from .models import Country, Region, VisitedRegion
-from .serializers import CountrySerializer, RegionSerializer, VisitedRegionSerializer
+from .serializers import CountrySerializer, RegionSerializer, VisitedRegionSerializer, geometry_resolution
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
@@ -8,67 +7,225 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 import os
 import json
-from django.http import JsonResponse
-from django.contrib.gis.geos import Point
-from django.conf import settings
 from rest_framework.decorators import action
-from django.contrib.staticfiles import finders
-from adventures.models import Adventure
+from adventures.cache import CATALOG_SCOPE, cached_response, user_visits_scope
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
+from rest_framework.permissions import AllowAny
+from rest_framework.decorators import authentication_classes
+from .catalog import catalog_payload, catalog_version
+from .geojson import geojson_variant
+from .lookup import MAX_POINTS, check_user_regions, regions_for_points
+from .tiles import MVT_CONTENT_TYPE, cached_tile, valid_tile
+
+# versioned catalog URLs never change content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def negotiate_encoding(request, available):
+    """
+    'br' or 'gzip' when the client accepts it and a precompressed copy exists, else None.
+    """
+    accepted = {part.split(';')[0].strip() for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+    return next((e for e in ('br', 'gzip') if e in accepted and e in available), None)
+
+
+def catalog_response(request, payload, version, cache_control):
+    """
+    Sends a pre-serialized catalog payload in the best encoding the client accepts,
+    or a 304 when its ETag matches.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if payload.etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        encoding = negotiate_encoding(request, payload.encoded)
+        response = HttpResponse(payload.encoded[encoding] if encoding else payload.body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = payload.etag
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding'
+    response['X-Catalog-Version'] = version
+    return response
+
+
+def is_sparse(request):
+    # ?fields= / ?omit= responses differ from the prebuilt payloads
+    return 'fields' in request.query_params or 'omit' in request.query_params
+
+
+def unversioned_catalog_response(request, name):
+    version = catalog_version()
+    payload = catalog_payload(name, version)
+    if payload is None:
+        raise Http404
+    # the unversioned URLs change with the catalog, so clients revalidate with the ETag
+    return catalog_response(request, payload, version, 'no-cache')
+
+
+CATALOG_URL_NAMES = {
+    'countries': 'catalog-countries',
+    'regions': 'catalog-regions',
+}
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def catalog_index(request):
+    """
+    The current catalog version and the versioned URLs to load it from.
+    """
+    version = catalog_version()
+    response = Response({
+        'version': version,
+        'countries': reverse('catalog-countries', args=[version]),
+        'regions': reverse('catalog-regions', args=[version]),
+        'regions_by_country': reverse('catalog-country-regions', args=[version, 'xx']).replace('/xx/', '/{country_code}/'),
+    })
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def versioned_catalog(request, version, name='countries', country_code=None):
+    """
+    Catalog payloads under a version in the URL, cacheable forever. Only reads the
+    version stamp and memory, no database access once a payload is built.
+    """
+    current = catalog_version()
+    if version != current:
+        if country_code:
+            url = reverse('catalog-country-regions', args=[current, country_code])
+        else:
+            url = reverse(CATALOG_URL_NAMES[name], args=[current])
+        if request.GET:
+            url = f'{url}?{request.GET.urlencode()}'
+        response = HttpResponseRedirect(url)
+        response['Cache-Control'] = 'no-cache'
+        return response
+    geometry = geometry_resolution(request.query_params.get('geometry')) if name == 'regions' else None
+    payload = catalog_payload(f'regions:{country_code}' if country_code else name, current, geometry)
+    if payload is None:
+        raise Http404
+    return catalog_response(request, payload, current, IMMUTABLE_CACHE_CONTROL)
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def regions_by_country(request, country_code):
     # require authentication
+    # carries the user's visited flags, so it is cached per user rather than shared
+    return cached_response(request, f'regions:{country_code}', [CATALOG_SCOPE, user_visits_scope(request.user.id)],
+                           lambda: build_regions_by_country(request, country_code))
+
+
+def build_regions_by_country(request, country_code):
     country = get_object_or_404(Country, country_code=country_code)
     regions = Region.objects.filter(country=country).order_by('name')
-    serializer = RegionSerializer(regions, many=True)
+    regions = RegionSerializer(context={'request': request}).sparse_queryset(regions)
+    serializer = RegionSerializer(regions, many=True, context={'request': request})
     return Response(serializer.data)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def visits_by_country(request, country_code):
+    return cached_response(request, f'visits:{country_code}', [user_visits_scope(request.user.id)],
+                           lambda: build_visits_by_country(request, country_code))
+
+
+def build_visits_by_country(request, country_code):
     country = get_object_or_404(Country, country_code=country_code)
     visits = VisitedRegion.objects.filter(region__country=country, user_id=request.user.id)
 
     serializer = VisitedRegionSerializer(visits, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def tile(request, z, x, y):
+    """
+    A Mapbox Vector Tile with a `regions` layer (id, name, country_code, visited) and an
+    `adventures` layer of the user's adventures, cached on disk (see tiles.py).
+    """
+    if not valid_tile(z, x, y):
+        raise Http404
+    path, token = cached_tile(request.user.id, z, x, y)
+    stat = os.stat(path)
+    etag = f'"{token}-{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(open(path, 'rb'), content_type=MVT_CONTENT_TYPE)
+    response['ETag'] = etag
+    # tiles change with the user's visits, revalidated on every use
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 class CountryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        # ?fields= / ?omit= also defer the unused columns
+        return self.get_serializer().sparse_queryset(Country.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        if not is_sparse(request):
+            return unversioned_catalog_response(request, 'countries')
+        return cached_response(request, 'countries', [CATALOG_SCOPE],
+                               lambda: super(CountryViewSet, self).list(request, *args, **kwargs))
+
     @action(detail=False, methods=['get'])
     def check_point_in_region(self, request):
         lat = float(request.query_params.get('lat'))
         lon = float(request.query_params.get('lon'))
-        point = Point(lon, lat, srid=4326)
-        
-        region = Region.objects.filter(geometry__contains=point).first()
+        region = regions_for_points([(lat, lon)])[0]
         
         if region:
-            return Response({'in_region': True, 'region_name': region.name, 'region_id': region.id})
+            return Response({'in_region': True, 'region_name': region['region_name'], 'region_id': region['region_id']})
         else:
             return Response({'in_region': False})
         
-    # make a post action that will get all of the users adventures and check if the point is in any of the regions if so make a visited region object for that user if it does not already exist
+    @action(detail=False, methods=['post'])
+    def check_points_in_regions(self, request):
+        """
+        Batch form of check_point_in_region: POST {"points": [{"lat": .., "lon": ..}, ...]}
+        and get one result per point, in the same order, from a single query.
+        """
+        points = request.data.get('points') if isinstance(request.data, dict) else None
+        if not isinstance(points, list):
+            return Response({'error': 'Expected a "points" list.'}, status=400)
+        if len(points) > MAX_POINTS:
+            return Response({'error': f'At most {MAX_POINTS} points can be checked at once.'}, status=400)
+
+        coordinates = []
+        for index, point in enumerate(points):
+            try:
+                lat, lon = float(point['lat']), float(point['lon'])
+            except (KeyError, TypeError, ValueError):
+                return Response({'error': f'Point {index} needs a numeric "lat" and "lon".'}, status=400)
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                return Response({'error': f'Point {index} is out of range.'}, status=400)
+            coordinates.append((lat, lon))
+
+        results = []
+        for (lat, lon), region in zip(coordinates, regions_for_points(coordinates)):
+            result = {'lat': lat, 'lon': lon, 'in_region': region is not None}
+            if region is not None:
+                result.update(region)
+            results.append(result)
+        return Response({'results': results})
+
     @action(detail=False, methods=['post'])
     def region_check_all_adventures(self, request):
-        adventures = Adventure.objects.filter(user_id=request.user.id, type='visited')
-        count = 0
-        for adventure in adventures:
-            if adventure.latitude is not None and adventure.longitude is not None:
-                try:
-                    print(f"Adventure {adventure.id}: lat={adventure.latitude}, lon={adventure.longitude}")
-                    point = Point(float(adventure.longitude), float(adventure.latitude), srid=4326)
-                    region = Region.objects.filter(geometry__contains=point).first()
-                    if region:
-                        if not VisitedRegion.objects.filter(user_id=request.user.id, region=region).exists():
-                            VisitedRegion.objects.create(user_id=request.user, region=region)
-                            count += 1
-                except Exception as e:
-                    print(f"Error processing adventure {adventure.id}: {e}")
-                    continue
+        # ?full=true rechecks every adventure instead of those changed since the last run
+        full = request.query_params.get('full', '').lower() in ('1', 'true')
+        count = check_user_regions(request.user.id, full=full)
         return Response({'regions_visited': count})
 
 class RegionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -76,6 +233,14 @@ class RegionViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = RegionSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        # only the geometry column of the requested ?geometry= resolution is read
+        return self.get_serializer().sparse_queryset(Region.objects.all())
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'regions', [CATALOG_SCOPE, user_visits_scope(request.user.id)],
+                               lambda: super(RegionViewSet, self).list(request, *args, **kwargs))
+
 class VisitedRegionViewSet(viewsets.ModelViewSet):
     serializer_class = VisitedRegionSerializer
     permission_classes = [IsAuthenticated]
@@ -99,34 +264,34 @@ class VisitedRegionViewSet(viewsets.ModelViewSet):
 
 class GeoJSONView(viewsets.ViewSet):
     """
-    Combine all GeoJSON data from .json files in static/data into a single GeoJSON object.
+    Combined GeoJSON of the .json files in static/data, built once (see geojson.py) and
+    sent precompressed. `?country=jp` or `?continent=AS` return only that part.
     """
     def list(self, request):
-        combined_geojson = {
-            "type": "FeatureCollection",
-            "features": []
-        }
-        
-        # Use Django's static file finder to locate the 'data' directory
-        data_dir = finders.find('data')
-        
-        if not data_dir or not os.path.isdir(data_dir):
-            return Response({"error": "Data directory does not exist."}, status=404)
-
-        for filename in os.listdir(data_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(data_dir, filename)
-                try:
-                    with open(file_path, 'r') as f:
-                        json_data = json.load(f)
-                        # Check if the JSON data is GeoJSON
-                        if isinstance(json_data, dict) and "type" in json_data:
-                            if json_data["type"] == "FeatureCollection":
-                                combined_geojson["features"].extend(json_data.get("features", []))
-                            elif json_data["type"] == "Feature":
-                                combined_geojson["features"].append(json_data)
-                            # You can add more conditions here for other GeoJSON types if needed
-                except (IOError, json.JSONDecodeError) as e:
-                    return Response({"error": f"Error reading file {filename}: {str(e)}"}, status=500)
-
-        return Response(combined_geojson)
\ No newline at end of file
+        country = request.query_params.get('country')
+        continent = request.query_params.get('continent')
+        if country:
+            name = f'country-{country.lower()}'
+        elif continent:
+            name = f'continent-{continent.lower()}'
+        else:
+            name = 'all'
+
+        try:
+            variant = geojson_variant(name)
+        except (IOError, json.JSONDecodeError) as e:
+            return Response({"error": f"Error building GeoJSON: {str(e)}"}, status=500)
+        if variant is None:
+            return Response({"error": "No GeoJSON data for this selection."}, status=404)
+
+        if variant['etag'] in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponse(status=304)
+        else:
+            encoding = negotiate_encoding(request, variant['files'])
+            response = FileResponse(open(variant['files'][encoding or 'identity'], 'rb'), content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = variant['etag']
+        response['Cache-Control'] = 'no-cache'
+        response['Vary'] = 'Accept-Encoding'
+        return response
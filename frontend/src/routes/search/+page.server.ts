@@ -30,7 +30,8 @@ export const load = (async (event) => {
 		return { error: error.error };
 	}
 
-	let adventures: Adventure[] = await res.json();
+	// search results are paginated, the first page is shown
+	let adventures: Adventure[] = (await res.json()).results;
 
 	let osmRes = await fetch(`https://nominatim.openstreetmap.org/search?q=${query}&format=jsonv2`, {
 		headers: {